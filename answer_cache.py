@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Entries kept in memory per process; 0 disables the cache
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "1024"))
+# Upper bound on the memory held by cached answers, in bytes of serialized JSON
+ANSWER_CACHE_MAX_BYTES = int(os.environ.get("ANSWER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# Seconds an answer stays valid, even if the corpus does not change
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+# SQLite file shared by all workers and kept across restarts; empty disables it
+ANSWER_CACHE_DB = os.environ.get("ANSWER_CACHE_DB", "")
+# Rows kept in the SQLite tier; the oldest answers beyond this are deleted
+ANSWER_CACHE_DB_ROWS = int(os.environ.get("ANSWER_CACHE_DB_ROWS", "100000"))
+# Puts between purges of expired and excess rows from the SQLite tier; 0 never purges
+ANSWER_CACHE_PURGE_EVERY = int(os.environ.get("ANSWER_CACHE_PURGE_EVERY", "256"))
+
+
+def normalize_question(question):
+    """Case-fold, collapse whitespace and drop trailing punctuation."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?!.")
+
+
+def corpus_fingerprint(hashes):
+    """Version of the corpus: changes whenever any file is added, removed or edited.
+
+    ``hashes`` maps each source to the hash of its content.
+    """
+    digest = hashlib.sha256()
+    for source in sorted(hashes):
+        digest.update(f"{source}\0{hashes[source]}\0".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class AnswerCache:
+    """LRU + TTL cache of answers, keyed on the normalized question and corpus version.
+
+    Because the corpus fingerprint is part of the key, answers computed against an
+    older corpus are never returned; they simply age out of the LRU. An optional
+    SQLite tier keeps answers across restarts and shares them between processes;
+    every ``purge_every`` puts it drops expired answers and the oldest ones beyond
+    ``max_rows``. An answer keeps the time it was computed when it moves between
+    tiers, so reading it never extends its TTL.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, max_bytes=ANSWER_CACHE_MAX_BYTES,
+                 ttl=ANSWER_CACHE_TTL, db_path=ANSWER_CACHE_DB, max_rows=ANSWER_CACHE_DB_ROWS,
+                 purge_every=ANSWER_CACHE_PURGE_EVERY):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.purge_every = purge_every
+        self.puts = 0
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+        if db_path:
+            with self._connect() as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, value TEXT, created REAL)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS answers_created ON answers (created)")
+
+    @staticmethod
+    def key(question, corpus_version, *extra):
+        return "|".join([corpus_version, normalize_question(question), *map(str, extra)])
+
+    def _connect(self):
+        # Connections must not cross a fork, so each worker opens its own
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db_pid = os.getpid()
+        return self._db
+
+    def get(self, key):
+        """The cached value for ``key``, or None on a miss."""
+        if self.max_entries <= 0:
+            return None
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                created, value, size = entry
+                if now - created <= self.ttl:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            row = self._get_from_disk(key, now)
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            value, created = row
+            self._store(key, value, created)
+            return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        now = time.time()
+        with self.lock:
+            self._store(key, value, now)
+            if self.db_path:
+                with self._connect() as db:
+                    db.execute(
+                        "INSERT OR REPLACE INTO answers (key, value, created) VALUES (?, ?, ?)",
+                        (key, json.dumps(value), now),
+                    )
+                    self.puts += 1
+                    if self.purge_every and self.puts % self.purge_every == 0:
+                        self._purge(db)
+
+    def _get_from_disk(self, key, now):
+        if not self.db_path:
+            return None
+        row = self._connect().execute(
+            "SELECT value, created FROM answers WHERE key = ? AND created >= ?", (key, now - self.ttl)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def _store(self, key, value, created):
+        if key in self.entries:
+            self._remove(key)
+        size = len(json.dumps(value))
+        self.entries[key] = (created, value, size)
+        self.bytes += size
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.bytes -= size
+
+    def purge_expired(self):
+        """Drop expired answers, and the oldest ones beyond ``max_rows``, from the shared on-disk tier."""
+        if self.db_path:
+            with self.lock, self._connect() as db:
+                self._purge(db)
+
+    def _purge(self, db):
+        db.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.ttl,))
+        db.execute(
+            "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,117 +1,229 @@
 import os
-from flask import Flask, request, render_template
-from PyPDF2 import PdfReader
-from bs4 import BeautifulSoup
-from transformers import pipeline, AutoModelForSeq2SeqLM, AutoTokenizer, AutoModelForQuestionAnswering
+import queue
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import Flask, Response, abort, g, request, render_template
 
+from answer_cache import AnswerCache, corpus_fingerprint
+from batching import MicroBatcher
+from extraction_cache import ExtractionCache, watch_folder
+from instrumentation import CONTENT_TYPE, PROFILER_ENDPOINTS, metrics, profiler, stage, start_pusher
+from documents import Corpus
+from model_registry import ModelRegistry
+from retrieval import PassageIndex
+from token_cache import CorpusTokens, TokenizedContext, answer_tokenized
 
-app = Flask(__name__)
 
-# Global variable for storing combined text
-combined_text = ""
-
-# Function to read different file types
-def read_pdf(file_path):
-    text = ""
-    try:
-        reader = PdfReader(file_path)
-        for page in reader.pages:
-            text += page.extract_text()
-    except Exception as e:
-        print(f"Error reading PDF {file_path}: {e}")
-    return text
-
-def read_html(file_path):
-    text = ""
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            soup = BeautifulSoup(file, "html.parser")
-            text = soup.get_text()
-    except Exception as e:
-        print(f"Error reading HTML {file_path}: {e}")
-    return text
-
-def read_text(file_path):
-    text = ""
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            text = file.read()
-    except Exception as e:
-        print(f"Error reading text file {file_path}: {e}")
-    return text
-
-def combine_folder_contents(content):
-    """Combine all file contents into a single string."""
-    combined_text = ""
-    for root, dirs, files in os.walk(content):
-        for file in files:
-            file_path = os.path.join(root, file)
-            if file.lower().endswith(".pdf"):
-                combined_text += read_pdf(file_path) + "\n"
-            elif file.lower().endswith((".html", ".htm")):
-                combined_text += read_html(file_path) + "\n"
-            elif file.lower().endswith(".txt"):
-                combined_text += read_text(file_path) + "\n"
-            else:
-                print(f"Skipping unsupported file: {file}")
-    return combined_text
-
-
-# Specify the models you need
-summarizer_model = "t5-small"
-qa_model = "distilbert-base-uncased-distilled-squad"
-
-# Load and save summarization pipeline
-summarizer = pipeline("summarization", model=summarizer_model)
-summarizer.model.save_pretrained("./t5-small")
-summarizer.tokenizer.save_pretrained("./t5-small")
-
-# Load and save QA pipeline
-qa_pipeline = pipeline("question-answering", model=qa_model)
-qa_pipeline.model.save_pretrained("./distilbert-base-uncased-distilled-squad")
-qa_pipeline.tokenizer.save_pretrained("./distilbert-base-uncased-distilled-squad")
-
-# Load summarization model and tokenizer locally
-summarizer = pipeline(
-    "summarization",
-    model=AutoModelForSeq2SeqLM.from_pretrained("./t5-small"),
-    tokenizer=AutoTokenizer.from_pretrained("./t5-small")
-)
-
-# Load question-answering model and tokenizer locally
-qa_pipeline = pipeline(
-    "question-answering",
-    model=AutoModelForQuestionAnswering.from_pretrained("./distilbert-base-uncased-distilled-squad"),
-    tokenizer=AutoTokenizer.from_pretrained("./distilbert-base-uncased-distilled-squad")
-)
+app = Flask(__name__)
 
+FOLDER_PATH = "contents"  # Replace with your folder path
+# Set by gunicorn.conf.py: the app is loaded once in the master and forked into workers,
+# so per-process threads are started by each worker after the fork instead of here
+SERVE_PRELOAD = os.environ.get("SERVE_PRELOAD", "0").lower() in ("1", "true")
+# Under preload, also copy the weights into /dev/shm before forking. Off by default: the models are in
+# eval mode and workers never write to their weights, so fork's copy-on-write already shares the pages,
+# and Docker's default 64 MB /dev/shm is too small for the copy
+SHARE_MODEL_MEMORY = os.environ.get("SHARE_MODEL_MEMORY", "0").lower() in ("1", "true")
+# Extraction cache for the contents folder, kept for watch mode
+content_cache = None
+# Page texts of every file in the contents folder, memory-mapped with an offset index
+corpus = None
+# Passage index built from the folder contents in init_app()
+passage_index = None
+# Fingerprint of the loaded corpus; part of every answer cache key
+corpus_version = ""
+# Answers to repeated questions, invalidated whenever the corpus changes
+answer_cache = AnswerCache()
+# Number of retrieved passages the QA model reads for each question
+TOP_K = int(os.environ.get("QA_TOP_K", "3"))
+# Seconds between polls of the contents folder; 0 disables watch mode
+WATCH_INTERVAL = float(os.environ.get("CONTENTS_WATCH_INTERVAL", "0"))
+# Tokenize the passages once for the QA model and keep the tokens on disk; 0 tokenizes per question
+QA_TOKEN_CACHE = os.environ.get("QA_TOKEN_CACHE", "1").lower() in ("1", "true")
+# Micro-batching of concurrent questions into one forward pass; window 0 disables it
+QA_BATCH_WINDOW_MS = float(os.environ.get("QA_BATCH_WINDOW_MS", "10"))
+QA_MAX_BATCH = int(os.environ.get("QA_MAX_BATCH", "16"))
+QA_QUEUE_DEPTH = int(os.environ.get("QA_QUEUE_DEPTH", "256"))
+QA_TIMEOUT = float(os.environ.get("QA_TIMEOUT", "30"))
+qa_batcher = None
+# Models are loaded on first use from their local directories, once per process
+models = ModelRegistry()
+
+def answer_question(question, top_k=TOP_K):
+    """Run extractive QA over the top-k retrieved passages only.
+
+    Returns the candidate answers, best first, each tagged with its source file.
+    """
+    cache_key = AnswerCache.key(question, corpus_version, top_k)
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    # Take one reference so a concurrent watch-mode update cannot swap it mid-question
+    index = passage_index
+    hits = index.search(question, top_k=top_k) if index else []
+    if not hits:
+        return []
+    contexts = [index.qa_context(passage_id) for passage_id, _ in hits]
+    with stage("qa"):
+        if qa_batcher:
+            future = qa_batcher.submit((question, contexts))
+            try:
+                results = future.result(timeout=QA_TIMEOUT)
+            except FutureTimeout:
+                # Still queued, the batcher drops it; nobody is waiting for the answer any more
+                future.cancel()
+                raise
+        else:
+            results = run_qa_batch([(question, contexts)])[0]
+    answers = [
+        {"answer": result["answer"], "score": result["score"], "source": index.source(passage_id)}
+        for result, (passage_id, _) in zip(results, hits)
+    ]
+    answers = sorted(answers, key=lambda candidate: candidate["score"], reverse=True)
+    answer_cache.put(cache_key, answers)
+    return answers
+
+def run_qa_batch(items):
+    """Answer several ``(question, contexts)`` requests in one batched forward pass.
+
+    Returns, for each request, the pipeline results for each of its contexts.
+    """
+    if isinstance(items[0][1][0], TokenizedContext):
+        return answer_tokenized(models.get("qa"), items, batch_size=32)
+    questions = [question for question, contexts in items for _ in contexts]
+    contexts = [context for _, item_contexts in items for context in item_contexts]
+    results = models.get("qa")(question=questions, context=contexts, batch_size=min(len(contexts), 32))
+    if isinstance(results, dict):
+        results = [results]
+    grouped, start = [], 0
+    for _, item_contexts in items:
+        grouped.append(results[start:start + len(item_contexts)])
+        start += len(item_contexts)
+    return grouped
+
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    metrics.observe(
+        "http_request_seconds", time.perf_counter() - g.start_time,
+        path=request.url_rule.rule if request.url_rule else "unmatched", status=response.status_code,
+    )
+    return response
+
+# Per-stage timings and counters of this worker, in the Prometheus text format
+@app.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+# Start or stop the sampling profiler in this worker; stop returns folded stacks
+@app.route("/debug/profiler", methods=["POST"])
+def profiler_switch():
+    if not PROFILER_ENDPOINTS:
+        abort(404)
+    if request.args.get("action", "start") == "start":
+        profiler.start(request.args.get("interval", type=float))
+        return profiler.report()
+    return profiler.stop()
 
 # Route for the home page
 @app.route("/", methods=["GET", "POST"])
 def index():
-    global combined_text
     answer = None
+    source = None
+    answers = []
     question = None
+    error = None
 
     if request.method == "POST":
         question = request.form.get("question")
-        if question and combined_text:
-            # Run the question through the model
-            result = qa_pipeline(question=question, context=combined_text)
-            answer = result["answer"]
-
-    return render_template("index.html", question=question, answer=answer)
+        if question:
+            # Run the question through the model over the best matching passages
+            try:
+                answers = answer_question(question)
+            except (queue.Full, FutureTimeout):
+                error = "The server is busy, please try again shortly."
+            if answers:
+                answer = answers[0]["answer"]
+                source = answers[0]["source"]
+
+    return render_template("index.html", question=question, answer=answer, source=source, answers=answers, error=error)
 
 # Initialize the app with data
 def init_app():
-    global combined_text
-    folder_path = "contents"  # Replace with your folder path
+    global corpus, corpus_version, passage_index, content_cache
+    folder_path = FOLDER_PATH
     print("Loading content from folder...")
-    combined_text = combine_folder_contents(folder_path)
+    start_time = time.perf_counter()
+    cache = content_cache = ExtractionCache()
+    cache.sync(folder_path)
+    # Pages stream from the cache into the corpus file one file at a time
+    corpus = Corpus()
+    corpus.append(cache.iter_pages(folder_path))
+    corpus_version = corpus_fingerprint(cache.hashes(folder_path))
+    print(f"Loaded {len(corpus.sources)} files ({len(corpus)} pages) in {time.perf_counter() - start_time:.2f}s")
+    start_time = time.perf_counter()
+    passage_index = PassageIndex.from_corpus(corpus)
+    print(f"Indexed {len(passage_index)} passages in {time.perf_counter() - start_time:.2f}s")
+    # The QA route needs this model; the summarizer stays unloaded until something asks for it
+    models.preload("qa")
+    if QA_TOKEN_CACHE:
+        passage_index.tokens = CorpusTokens.for_index(passage_index, models.get("qa").tokenizer, corpus_version)
+    if SERVE_PRELOAD and SHARE_MODEL_MEMORY:
+        models.share_memory()
+    metrics.gauge("answer_cache_hit_rate", lambda: answer_cache.stats()["hit_rate"], "Answer cache hit rate")
+    metrics.gauge("answer_cache_hits_total", lambda: answer_cache.hits, "Answer cache lookups that hit")
+    metrics.gauge("answer_cache_misses_total", lambda: answer_cache.misses, "Answer cache lookups that missed")
+    metrics.gauge("answer_cache_entries", lambda: answer_cache.stats()["entries"], "Answers held in memory")
+    metrics.gauge("qa_queue_depth", lambda: qa_batcher.queue_depth() if qa_batcher else 0, "Questions waiting for a batch")
+    metrics.gauge("corpus_pages", lambda: len(corpus), "Pages in the loaded corpus")
     print("Content loaded successfully.")
 
+# Threads do not survive a fork, so under preload each worker calls this after forking
+def start_background():
+    global qa_batcher
+    # Live dashboard feed (layout.py), when METRICS_PUSH_URL is set
+    start_pusher("qa")
+    if QA_BATCH_WINDOW_MS > 0:
+        qa_batcher = MicroBatcher(
+            run_qa_batch,
+            window=QA_BATCH_WINDOW_MS / 1000,
+            max_batch_size=QA_MAX_BATCH,
+            max_queue=QA_QUEUE_DEPTH,
+            name="qa-batcher",
+        )
+    if WATCH_INTERVAL > 0 and SERVE_PRELOAD:
+        # Workers share one corpus file, which only a single process may append to
+        print("Watch mode is not available with a preloaded app; restart the server to pick up changes.")
+    elif WATCH_INTERVAL > 0:
+        folder_path, cache = FOLDER_PATH, content_cache
+
+        def apply_content_changes(changed, removed):
+            """Swap in refreshed contents, re-indexing only the files that changed."""
+            global corpus, corpus_version, passage_index
+            new_pages = corpus.replace(changed + removed, cache.iter_pages(folder_path, sources=changed))
+            new_index = passage_index.updated(new_pages, changed + removed)
+            # New cache keys from here on; answers for the old corpus age out of the LRU
+            new_version = corpus_fingerprint(cache.hashes(folder_path))
+            if QA_TOKEN_CACHE:
+                # Tokens travel with their index, so a question never pairs one with the other's passages;
+                # only passages the current tokens do not have are tokenized
+                new_index.tokens = CorpusTokens.for_index(
+                    new_index, models.get("qa").tokenizer, new_version, previous=passage_index.tokens
+                )
+            # The update may have moved the index onto a compacted copy of the corpus
+            passage_index, corpus_version, corpus = new_index, new_version, new_index.corpus
+
+        watch_folder(cache, folder_path, apply_content_changes, interval=WATCH_INTERVAL)
+        print(f"Watching {folder_path} for changes every {WATCH_INTERVAL:g}s.")
+
 # Call the initialization function
 init_app()
+if not SERVE_PRELOAD:
+    start_background()
 
 if __name__ == "__main__":
     # Use environment variable for debug mode, default to False for safety
@@ -0,0 +1,161 @@
+import argparse
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from instrumentation import metrics, stage
+
+# Seconds the scheduler waits for more requests after the first one arrives
+BATCH_WINDOW = 0.01
+MAX_BATCH_SIZE = 16
+MAX_QUEUE_DEPTH = 256
+
+
+class MicroBatcher:
+    """Collects concurrent requests into batches run by a single background thread.
+
+    ``handler`` receives a list of items and must return one result per item, in
+    the same order. A batch is dispatched once ``max_batch_size`` items have
+    arrived or ``window`` seconds have passed since the first one, whichever
+    comes first. ``submit`` raises ``queue.Full`` when ``max_queue`` requests
+    are already waiting, so callers can shed load instead of piling up.
+    """
+
+    def __init__(self, handler, window=BATCH_WINDOW, max_batch_size=MAX_BATCH_SIZE,
+                 max_queue=MAX_QUEUE_DEPTH, name="micro-batcher"):
+        self.handler = handler
+        self.name = name
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.requests = queue.Queue(maxsize=max_queue)
+        self.batches = 0
+        self.items = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, item):
+        """Queue an item and return a Future that resolves to its own result."""
+        future = Future()
+        self.requests.put_nowait((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout=timeout)
+
+    def queue_depth(self):
+        return self.requests.qsize()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _collect(self):
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self.stopped.is_set():
+            batch = self._collect()
+            # Drop requests whose caller already gave up waiting
+            now = time.perf_counter()
+            batch = [
+                (item, future, queued) for item, future, queued in batch if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            # Time from submit to dispatch: the batching window plus waiting behind earlier batches
+            for _, _, queued in batch:
+                metrics.observe("stage_seconds", now - queued, stage="queue_wait", batcher=self.name)
+            try:
+                with stage("batch", batcher=self.name):
+                    results = self.handler([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+
+def measure(call, items, concurrency=8):
+    """Run ``call`` over the items from concurrent threads and time each call.
+
+    Returns throughput in calls per second and p50/p99 latency in milliseconds.
+    """
+    latencies = []
+
+    def timed(item):
+        start_time = time.perf_counter()
+        call(item)
+        latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, items))
+    elapsed = time.perf_counter() - start_time
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": len(items),
+        "concurrency": concurrency,
+        "throughput": len(items) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def main():
+    """Compare QA throughput and latency with and without micro-batching."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--window-ms", type=float, default=BATCH_WINDOW * 1000)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_SIZE)
+    args = parser.parse_args()
+
+    from model_registry import ModelRegistry
+
+    qa = ModelRegistry().get("qa")
+    context = (
+        "NVIDIA was founded in 1993 by Jensen Huang, Chris Malachowsky and Curtis Priem. "
+        "The company designs graphics processing units for gaming, data centers and cars. "
+    ) * 8
+    questions = ["Who founded NVIDIA?", "When was NVIDIA founded?", "What does the company design?"]
+    items = [questions[i % len(questions)] for i in range(args.requests)]
+
+    def run_batch(batch):
+        results = qa(question=batch, context=[context] * len(batch), batch_size=len(batch))
+        return [results] if isinstance(results, dict) else results
+
+    unbatched = measure(lambda question: run_batch([question]), items, args.concurrency)
+    batcher = MicroBatcher(run_batch, window=args.window_ms / 1000, max_batch_size=args.max_batch)
+    batched = measure(batcher, items, args.concurrency)
+    batcher.close()
+
+    for label, stats in (("unbatched", unbatched), ("batched", batched)):
+        print(
+            f"{label:>10}: {stats['throughput']:.1f} req/s, "
+            f"p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms"
+        )
+    print(f"Average batch size: {batcher.items / max(batcher.batches, 1):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import random
+
+WORDS = (
+    "revenue growth market product customer data center gaming platform software hardware "
+    "quarter annual report margin demand supply chain partner research design chip memory "
+    "network cloud service model training inference energy efficiency performance cost "
+    "strategy investment segment region outlook risk operation team process system"
+).split()
+PRODUCTS = ["Hopper", "Ampere", "Blackwell", "Orin", "Grace", "Volta", "Turing", "Pascal"]
+PEOPLE = ["Ada Lovelace", "Alan Turing", "Grace Hopper", "Claude Shannon", "Edsger Dijkstra"]
+CITIES = ["Santa Clara", "Austin", "Toronto", "Berlin", "Tokyo", "Bangalore"]
+
+# Corpus sizes: (pdf files, html files, txt files, pages per pdf, words per page)
+SIZES = {
+    "small": (4, 3, 3, 4, 250),
+    "medium": (20, 10, 10, 12, 400),
+    "large": (60, 30, 30, 30, 500),
+}
+
+
+def sentence(rng):
+    words = rng.choices(WORDS, k=rng.randint(8, 18))
+    return " ".join(words).capitalize() + "."
+
+
+def fact(rng):
+    """One sentence stating a fact, and a question it answers with the expected answer."""
+    product, person, city = rng.choice(PRODUCTS), rng.choice(PEOPLE), rng.choice(CITIES)
+    year = rng.randint(1990, 2024)
+    return (
+        f"The {product} platform was designed by {person} in {city} in {year}.",
+        (f"Who designed the {product} platform in {city}?", person),
+    )
+
+
+def page_text(rng, words, facts):
+    """A page of filler sentences with a fact mixed in every ~100 words."""
+    sentences, count = [], 0
+    while count < words:
+        if rng.random() < 0.12:
+            text, qa = fact(rng)
+            facts.append(qa)
+        else:
+            text = sentence(rng)
+        sentences.append(text)
+        count += len(text.split())
+    return " ".join(sentences)
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text, width=90):
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def write_pdf(path, pages):
+    """Write a plain text PDF with one page per string, using the built-in Helvetica font."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for text in pages:
+        lines = "\n".join(f"({_pdf_escape(line)}) Tj T*" for line in _wrap(text))
+        stream = f"BT /F1 10 Tf 12 TL 50 800 Td\n{lines}\nET".encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_refs)} >>".encode("ascii")
+
+    with open(path, "wb") as file:
+        file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(file.tell())
+            file.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = file.tell()
+        file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            file.write(b"%010d 00000 n \n" % offset)
+        file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def write_html(path, title, paragraphs):
+    body = "\n".join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(f"<html><head><title>{title}</title><script>var x = 1;</script></head>"
+                   f"<body><h1>{title}</h1>\n{body}\n</body></html>\n")
+
+
+def generate_corpus(folder, pdfs, htmls, txts, pages_per_pdf, words_per_page, seed=0):
+    """Write a synthetic corpus of PDF, HTML and text files into ``folder``.
+
+    Returns ``(question, answer)`` pairs for facts planted in the text, for QA benchmarks.
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    facts = []
+    for i in range(pdfs):
+        write_pdf(
+            os.path.join(folder, f"report_{i:03d}.pdf"),
+            [page_text(rng, words_per_page, facts) for _ in range(pages_per_pdf)],
+        )
+    for i in range(htmls):
+        write_html(
+            os.path.join(folder, f"page_{i:03d}.html"),
+            f"Page {i}",
+            [page_text(rng, words_per_page // 4, facts) for _ in range(4)],
+        )
+    for i in range(txts):
+        with open(os.path.join(folder, f"notes_{i:03d}.txt"), "w", encoding="utf-8") as file:
+            file.write(page_text(rng, words_per_page, facts))
+    return facts
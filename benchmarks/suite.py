@@ -0,0 +1,424 @@
+# End-to-end benchmarks over a synthetic corpus, run from the repository root:
+#   python -m benchmarks.suite --size small --save-baseline   # store a baseline
+#   python -m benchmarks.suite --size small                   # compare against it
+# Everything runs offline on CPU: models come from the local model directories
+# (MODELS_DIR), and embeddings use the local QA model's encoder as a stand-in.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.corpus import SIZES, generate_corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+BENCHMARKS = ("extraction", "retrieval", "qa", "summarization", "embedding", "http")
+# A metric regresses when it is this much worse than its baseline (0.25 = 25%)
+TOLERANCE = 0.25
+
+
+def percentiles_ms(latencies):
+    return {
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+    }
+
+
+def timed_calls(function, items):
+    latencies = []
+    for item in items:
+        start_time = time.perf_counter()
+        function(item)
+        latencies.append(time.perf_counter() - start_time)
+    return latencies
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_extraction(context):
+    from extraction import EXTRACT_WORKERS, extract_folder
+    from extraction_cache import ExtractionCache
+
+    metrics = {}
+    for workers in sorted({1, EXTRACT_WORKERS}):
+        start_time = time.perf_counter()
+        pages = sum(len(texts) for texts in extract_folder(context["corpus"], workers=workers).values())
+        metrics[f"pages_per_s_{workers}_workers"] = pages / (time.perf_counter() - start_time)
+    cache = ExtractionCache(os.path.join(context["workdir"], "extract_cache"))
+    start_time = time.perf_counter()
+    cache.sync(context["corpus"], verbose=False)
+    metrics["cache_cold_sync_s"] = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    cache.sync(context["corpus"], verbose=False)
+    metrics["cache_warm_sync_s"] = time.perf_counter() - start_time
+    return metrics
+
+
+def _passage_index(context):
+    if "passage_index" not in context:
+        from documents import Corpus
+        from extraction_cache import ExtractionCache
+        from retrieval import PassageIndex
+
+        cache = ExtractionCache(os.path.join(context["workdir"], "extract_cache"))
+        cache.sync(context["corpus"], verbose=False)
+        corpus = Corpus()
+        corpus.append(cache.iter_pages(context["corpus"]))
+        start_time = time.perf_counter()
+        context["passage_index"] = PassageIndex.from_corpus(corpus)
+        context["index_build_s"] = time.perf_counter() - start_time
+    return context["passage_index"]
+
+
+def bench_retrieval(context):
+    index = _passage_index(context)
+    questions = [question for question, _ in context["facts"]]
+    latencies = timed_calls(lambda question: index.search(question, top_k=3), questions * 5)
+    return {"index_build_s": context["index_build_s"], "passages": len(index), **percentiles_ms(latencies)}
+
+
+def bench_qa(context):
+    from token_cache import CorpusTokens, answer_tokenized
+
+    index = _passage_index(context)
+    qa = context["models"].get("qa")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start_time = time.perf_counter()
+        tokens = CorpusTokens.for_index(index, qa.tokenizer, "benchmark", cache_dir)
+        tokenize_s = time.perf_counter() - start_time
+
+        def answer(question):
+            # The app's path: only the question is tokenized, passages come from the token cache
+            hits = index.search(question, top_k=3)
+            contexts = [tokens.context(passage_id, index.passage_text(passage_id)) for passage_id, _ in hits]
+            return answer_tokenized(qa, [(question, contexts)])
+
+        def answer_pipeline(question):
+            hits = index.search(question, top_k=3)
+            contexts = [index.passage_text(passage_id) for passage_id, _ in hits]
+            return qa(question=[question] * len(contexts), context=contexts)
+
+        questions = [question for question, _ in context["facts"]][:context["queries"]]
+        results = {"corpus_tokenize_s": tokenize_s}
+        for prefix, function in (("", answer), ("pipeline_", answer_pipeline)):
+            function(questions[0])  # warm up
+            start_time = time.perf_counter()
+            latencies = timed_calls(function, questions)
+            results[f"{prefix}questions_per_s"] = len(questions) / (time.perf_counter() - start_time)
+            results.update({f"{prefix}{key}": value for key, value in percentiles_ms(latencies).items()})
+        return results
+
+
+def bench_summarization(context):
+    from extraction import extract_folder
+    from summarization import count_tokens, summarize_document
+
+    summarizer = context["models"].get("summarizer")
+    documents = list(extract_folder(context["corpus"], workers=1).values())[:context["documents"]]
+    tokens = sum(count_tokens(" ".join(pages), summarizer.tokenizer) for pages in documents)
+    start_time = time.perf_counter()
+    for pages in documents:
+        summarize_document(pages, summarizer, num_beams=1)
+    elapsed = time.perf_counter() - start_time
+    return {"documents_per_s": len(documents) / elapsed, "input_tokens_per_s": tokens / elapsed}
+
+
+class EncoderEmbeddings:
+    """Stand-in sentence embeddings: mean-pooled hidden states of a local encoder model."""
+
+    def __init__(self, model_dir, batch_size=32):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
+        self.model = AutoModel.from_pretrained(model_dir, local_files_only=True).eval()
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + self.batch_size], padding=True, truncation=True, max_length=256, return_tensors="pt"
+            )
+            with self.torch.inference_mode():
+                hidden = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1)
+            vectors.extend(((hidden * mask).sum(1) / mask.sum(1)).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def bench_embedding(context):
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from embedding_store import CachedEmbeddings, EmbeddingStore
+    from extraction import extract_folder
+    from vector_index import VectorIndex
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    documents = splitter.split_documents([
+        Document(page_content=text, metadata={"source": source})
+        for source, pages in extract_folder(context["corpus"], workers=1).items()
+        for text in pages
+    ])
+    base = EncoderEmbeddings(os.path.join(context["models_dir"], "distilbert-base-uncased-distilled-squad"))
+    embedding = CachedEmbeddings(base, EmbeddingStore(os.path.join(context["workdir"], "embeddings")))
+    texts = [doc.page_content for doc in documents]
+    start_time = time.perf_counter()
+    embedding.embed_documents(texts)
+    cold = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    vectors = embedding.embed_documents(texts)
+    warm = time.perf_counter() - start_time
+
+    index = VectorIndex(vectors, documents)
+    queries = [embedding.embed_query(question) for question, _ in context["facts"][:context["queries"]]]
+    metrics = {
+        "chunks": len(texts),
+        "chunks_per_s": len(texts) / cold,
+        "cached_reembed_s": warm,
+        "numpy_query": percentiles_ms(timed_calls(lambda vector: index.search(vector, 4), queries)),
+    }
+    try:
+        from langchain_community.vectorstores import Chroma
+    except ImportError:
+        return metrics
+    from vector_index import compare_with_chroma
+
+    db = Chroma(
+        collection_name="benchmark",
+        embedding_function=embedding,
+        persist_directory=os.path.join(context["workdir"], "chroma"),
+    )
+    db.add_documents(documents)
+    report = compare_with_chroma(db, index, queries, 4)
+    metrics["chroma_query"] = report["chroma"]
+    metrics["chroma_recall_at_k"] = report["chroma_recall_at_k"]
+    return metrics
+
+
+def _load(url, payloads, concurrency, method="post"):
+    import httpx
+
+    latencies, failures = [], 0
+    with httpx.Client(timeout=120) as client:
+        def call(payload):
+            start_time = time.perf_counter()
+            response = getattr(client, method)(url, **payload)
+            return time.perf_counter() - start_time, response.status_code
+
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for seconds, status in executor.map(call, payloads):
+                latencies.append(seconds)
+                failures += status != 200
+        elapsed = time.perf_counter() - start_time
+    return {"requests_per_s": len(payloads) / elapsed, "error_rate": failures / len(payloads), **percentiles_ms(latencies)}
+
+
+def _wait_for(url, process, timeout=300, log_path=None):
+    import httpx
+
+    def failure(message):
+        # The work directory is removed after the run, so the end of the server's log goes in the error
+        if log_path and os.path.exists(log_path):
+            with open(log_path, "r", encoding="utf-8", errors="replace") as file:
+                message += "\n--- server log (last lines) ---\n" + "".join(file.readlines()[-40:])
+        return RuntimeError(message)
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise failure(f"Server exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    raise failure(f"{url} did not come up within {timeout}s")
+
+
+def bench_http(context):
+    """Load the Flask QA page over HTTP, and the fan-out engine against stand-in backends."""
+    metrics = {}
+    workdir = os.path.join(context["workdir"], "flask")
+    os.makedirs(workdir, exist_ok=True)
+    os.symlink(os.path.abspath(context["corpus"]), os.path.join(workdir, "contents"))
+    port = free_port()
+    # The answer cache would turn every repeated question into a lookup, so it is off: this measures the model
+    env = dict(
+        os.environ,
+        MODELS_DIR=context["models_dir"],
+        # Missing weights fail at startup instead of being fetched from the Hub mid-benchmark
+        MODELS_OFFLINE="1",
+        EXTRACT_CACHE_DIR=os.path.join(workdir, "cache"),
+        TOKEN_CACHE_DIR=os.path.join(workdir, "tokens"),
+        ANSWER_CACHE_SIZE="0",
+        ANSWER_CACHE_DB="",
+    )
+    log_path = os.path.join(workdir, "server.log")
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "flask", "--app", os.path.join(ROOT, "app.py"), "run", "--port", str(port), "--with-threads"],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        url = f"http://127.0.0.1:{port}/"
+        _wait_for(url, process, log_path=log_path)
+        questions = [question for question, _ in context["facts"]]
+        payloads = [{"data": {"question": random.Random(i).choice(questions)}} for i in range(context["requests"])]
+        metrics["flask_qa"] = _load(url, payloads, context["concurrency"])
+    finally:
+        process.terminate()
+        process.wait()
+
+    sys.path.insert(0, os.path.join(ROOT, "concurrent-rest-service"))
+    try:
+        from fanout import Backend, FanOut, load_test
+        from standin_backends import make_backend, serve_in_thread
+    except ImportError as e:
+        print(f"Skipping the fan-out benchmark, its dependencies are missing ({e}); pip install -r requirements.txt")
+        return metrics
+
+    servers, backends = [], []
+    for i, spec in enumerate(["lognormal:0.01,0.3+tail:0.02,0.2"] * 3):
+        port = free_port()
+        servers.append(serve_in_thread(make_backend(f"backend{i}", spec), port))
+        backends.append(Backend(f"backend{i}", f"http://127.0.0.1:{port}"))
+
+    async def run():
+        fanout = FanOut(backends, deadline=1.0)
+        try:
+            return await load_test(fanout, context["requests"], context["concurrency"])
+        finally:
+            await fanout.close()
+
+    report = asyncio.run(run())
+    for server in servers:
+        server.should_exit = True
+    metrics["fanout"] = {key: report[key] for key in ("requests_per_s", "p50_ms", "p99_ms", "partial_rate")}
+    return metrics
+
+
+def flatten(metrics, prefix=""):
+    flat = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def lower_is_better(name):
+    return name.endswith(("_ms", "_s", "error_rate", "partial_rate")) and not name.endswith("per_s")
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Rows of (metric, baseline, current, change, regressed) for metrics present in both runs."""
+    current, previous = flatten(results["metrics"]), flatten(baseline["metrics"])
+    rows = []
+    for name in sorted(set(current) & set(previous)):
+        new, old = current[name], previous[name]
+        if not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or name.endswith(("chunks", "passages")):
+            continue
+        change = (new - old) / old if old else 0.0
+        worse = change > tolerance if lower_is_better(name) else change < -tolerance
+        # Tiny absolute values (sub-millisecond timings, near-zero rates) are mostly noise
+        if lower_is_better(name) and abs(new - old) < (1.0 if name.endswith("_ms") else 0.01):
+            worse = False
+        rows.append((name, old, new, change, worse))
+    return rows
+
+
+def main():
+    """Run the benchmark suite on a synthetic corpus and compare against a stored baseline."""
+    from model_registry import MODELS_DIR, ModelRegistry
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--queries", type=int, default=50, help="questions for QA and vector search")
+    parser.add_argument("--documents", type=int, default=4, help="documents to summarize")
+    parser.add_argument("--requests", type=int, default=100, help="HTTP requests per load test")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--baseline", help="baseline JSON (default benchmarks/baselines/<size>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--output", help="also write this run's results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="xformer-bench-")
+    context = {
+        "workdir": workdir,
+        "corpus": os.path.join(workdir, "contents"),
+        "models_dir": args.models_dir,
+        "models": ModelRegistry(models_dir=args.models_dir, offline=True),
+        "queries": args.queries,
+        "documents": args.documents,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+    }
+    try:
+        context["facts"] = generate_corpus(context["corpus"], *SIZES[args.size], seed=args.seed)
+        metrics = {}
+        for name in BENCHMARKS:
+            if name in args.only:
+                print(f"== {name}")
+                metrics[name] = globals()[f"bench_{name}"](context)
+                print(json.dumps(metrics[name], indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "size": args.size,
+        "timestamp": time.time(),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "metrics": metrics,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{args.size}.json")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to {baseline_path}")
+        return
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --save-baseline to create one")
+        return
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        rows = compare(results, json.load(file), args.tolerance)
+    regressions = [row for row in rows if row[4]]
+    for name, old, new, change, worse in rows:
+        print(f"{'REGRESSED' if worse else 'ok':>9}  {name:<45} {old:>12.3f} -> {new:>12.3f} ({change:+.1%})")
+    if regressions:
+        raise SystemExit(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import deque
+
+import httpx
+
+# Shared instrumentation lives at the repository root, next to this service's folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from instrumentation import metrics  # noqa: E402
+
+# Whole fan-out budget in seconds; backends that have not answered by then are left out
+FANOUT_DEADLINE = float(os.environ.get("FANOUT_DEADLINE", "2.0"))
+# In-flight requests allowed per backend, including hedges
+BACKEND_CONCURRENCY = int(os.environ.get("BACKEND_CONCURRENCY", "32"))
+# Latencies remembered per backend, and how many are needed before hedging starts
+LATENCY_WINDOW = 1000
+HEDGE_MIN_SAMPLES = 20
+
+# httpx logs every request at INFO, which drowns the service log under fan-out load
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def parse_backends(spec: str):
+    """``name=url,name=url`` -> {name: url}."""
+    backends = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, url = entry.partition("=")
+        backends[name] = url
+    return backends
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class Backend:
+    """One downstream service: a pooled keep-alive client, a concurrency limit and latency stats."""
+
+    def __init__(self, name: str, base_url: str, max_concurrency: int = BACKEND_CONCURRENCY, transport=None):
+        self.name = name
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            timeout=None,
+            transport=transport,
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self):
+        """Time after which a duplicate request is sent: the backend's p95 latency."""
+        if len(self.latency.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return self.latency.percentile(95)
+
+    async def get(self, path: str, params=None):
+        async with self.semaphore:
+            start_time = time.perf_counter()
+            try:
+                response = await self.client.get(path, params=params)
+            except asyncio.CancelledError:
+                # Cut off by a winning hedge or the deadline: the call took at least this long, and
+                # leaving it out would bias the hedge delay towards the calls that were fast
+                self.latency.record(time.perf_counter() - start_time)
+                raise
+            response.raise_for_status()
+            elapsed = time.perf_counter() - start_time
+            self.latency.record(elapsed)
+            metrics.observe("stage_seconds", elapsed, stage="fanout_call", backend=self.name)
+            self.calls += 1
+            return response.json()
+
+    async def get_hedged(self, path: str, params=None):
+        """Call the backend, sending one duplicate if the first call outlives the p95 latency.
+
+        Whichever call answers first wins and the other is cancelled.
+        """
+        primary = asyncio.ensure_future(self.get(path, params))
+        calls = [primary]
+        try:
+            delay = self.hedge_delay()
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            self.hedges += 1
+            metrics.inc("fanout_hedges_total", backend=self.name)
+            hedge = asyncio.ensure_future(self.get(path, params))
+            calls.append(hedge)
+            pending = set(calls)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.hedge_wins += task is hedge
+                        return task.result()
+            # Both failed; surface the primary's error
+            return primary.result()
+        finally:
+            # Also reached when the caller cancels us at the deadline
+            for task in calls:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "p50": self.latency.percentile(50),
+            "p95": self.latency.percentile(95),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class FanOut:
+    """Calls every backend concurrently and returns whatever has arrived by the deadline."""
+
+    def __init__(self, backends, deadline: float = FANOUT_DEADLINE, hedge: bool = True):
+        self.backends = list(backends)
+        self.deadline = deadline
+        self.hedge = hedge
+
+    async def fetch(self, path: str, params=None, deadline: float = None):
+        """Fan one request out to all backends.
+
+        Returns the results of backends that answered in time, the backends that
+        missed the deadline (their calls are cancelled) and any errors.
+        """
+        start_time = time.perf_counter()
+        tasks = {
+            asyncio.ensure_future(
+                backend.get_hedged(path, params) if self.hedge else backend.get(path, params)
+            ): backend.name
+            for backend in self.backends
+        }
+        done, pending = await asyncio.wait(tasks, timeout=deadline or self.deadline) if tasks else (set(), set())
+        for task in pending:
+            task.cancel()
+        results, errors = {}, {}
+        for task in done:
+            if task.exception() is None:
+                results[tasks[task]] = task.result()
+            else:
+                errors[tasks[task]] = repr(task.exception())
+        for task in pending:
+            metrics.inc("fanout_missed_total", backend=tasks[task])
+        for name in errors:
+            metrics.inc("fanout_errors_total", backend=name)
+        metrics.observe("stage_seconds", time.perf_counter() - start_time, stage="fanout")
+        if pending:
+            logging.info(f"Fan-out deadline hit; missing {sorted(tasks[task] for task in pending)}")
+        return {
+            "results": results,
+            "missed": sorted(tasks[task] for task in pending),
+            "errors": errors,
+            "partial": bool(pending or errors),
+            "total_time": time.perf_counter() - start_time,
+        }
+
+    def stats(self):
+        return {backend.name: backend.stats() for backend in self.backends}
+
+    async def close(self):
+        await asyncio.gather(*(backend.close() for backend in self.backends))
+
+
+async def load_test(fanout: FanOut, requests: int, concurrency: int):
+    """Issue fan-out requests from ``concurrency`` loops and summarise latency and completeness."""
+    latencies, partial = [], 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal partial
+        for i in counter:
+            response = await fanout.fetch("/work", {"item": str(i)})
+            latencies.append(response["total_time"])
+            partial += response["partial"]
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+    latencies.sort()
+    return {
+        "requests_per_s": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000,
+        "partial_rate": partial / requests,
+        "backends": fanout.stats(),
+    }
+
+
+def main():
+    """Load-test the fan-out engine against in-process stand-in backends, with and without hedging."""
+    from standin_backends import make_backend
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--latencies", nargs="+", default=["lognormal:0.02,0.3+tail:0.02,0.5"] * 3)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--deadline", type=float, default=FANOUT_DEADLINE)
+    args = parser.parse_args()
+
+    async def run(hedge):
+        # ASGITransport calls the stand-in apps directly, so no ports or network are needed
+        backends = [
+            Backend(f"backend{i + 1}", "http://standin", transport=httpx.ASGITransport(app=make_backend(f"backend{i + 1}", spec)))
+            for i, spec in enumerate(args.latencies)
+        ]
+        fanout = FanOut(backends, args.deadline, hedge=hedge)
+        try:
+            return await load_test(fanout, args.requests, args.concurrency)
+        finally:
+            await fanout.close()
+
+    for hedge in (False, True):
+        report = asyncio.run(run(hedge))
+        hedges = sum(stats["hedges"] for stats in report["backends"].values())
+        print(
+            f"hedging {'on ' if hedge else 'off'}: {report['requests_per_s']:.0f} req/s, "
+            f"p50 {report['p50_ms']:.0f} ms, p99 {report['p99_ms']:.0f} ms, "
+            f"partial {report['partial_rate']:.1%}, hedges sent {hedges}"
+        )
+
+
+if __name__ == "__main__":
+    main()
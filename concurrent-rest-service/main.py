@@ -1,4 +1,11 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import json
+import os
+import sys
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
 import asyncio
 import random
 import time
@@ -6,11 +13,77 @@ import logging
 
 from starlette.responses import StreamingResponse
 
+# The model code lives at the repository root, next to this service's folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fanout import Backend, FanOut, parse_backends  # noqa: E402
+from model_serving import InferencePool, Overloaded  # noqa: E402
+from instrumentation import CONTENT_TYPE, PROFILER_ENDPOINTS, metrics, profiler, start_pusher  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402
+from summarization import summarize_document  # noqa: E402
+
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-app = FastAPI()
+# Downstream services for /fanout, as "name=url,name=url"
+FANOUT_BACKENDS = os.environ.get("FANOUT_BACKENDS", "")
+fanout = None
+# Models are loaded once per worker process, on first use unless listed in PRELOAD_MODELS
+PRELOAD_MODELS = [name for name in os.environ.get("PRELOAD_MODELS", "").split(",") if name]
+models = ModelRegistry()
+inference = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Open one pooled client per backend in each worker, and close them on shutdown"""
+    global fanout, inference
+    backends = parse_backends(FANOUT_BACKENDS)
+    fanout = FanOut([Backend(name, url) for name, url in backends.items()])
+    inference = InferencePool()
+    metrics.gauge("inference_in_flight", lambda: inference.in_flight, "Inference calls running or queued")
+    metrics.gauge("inference_queue_depth", lambda: inference.queue_depth(), "Inference calls waiting for a thread")
+    metrics.gauge("inference_shed_total", lambda: inference.shed, "Inference requests rejected with 429")
+    metrics.gauge("inference_timeouts_total", lambda: inference.timeouts, "Inference requests answered with 504")
+    if PRELOAD_MODELS:
+        await asyncio.to_thread(models.preload, *PRELOAD_MODELS)
+    # Live dashboard feed (layout.py), when METRICS_PUSH_URL is set
+    pusher = start_pusher("rest")
+    yield
+    if pusher:
+        pusher.stop()
+    await fanout.close()
+    inference.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    # Labelled by route template so unknown URLs cannot blow up the label set;
+    # streaming responses are timed up to their first byte
+    route = request.scope.get("route")
+    metrics.observe(
+        "http_request_seconds", time.perf_counter() - start_time,
+        path=route.path if route else "unmatched", status=response.status_code,
+    )
+    return response
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed load with a 429 instead of queueing requests without bound"""
+    return JSONResponse(
+        status_code=429, content={"error": str(exc)}, headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(asyncio.TimeoutError)
+async def timeout_handler(request: Request, exc: asyncio.TimeoutError):
+    return JSONResponse(status_code=504, content={"error": "Inference timed out"})
 
 async def simulated_service(service_name: str):
     """Simulate an async service with random delay"""
@@ -94,3 +167,105 @@ async def event_stream():
 async def stream_responses():
     """Send responses to the frontend as they become available"""
     return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.get("/fanout")
+async def fanout_requests(path: str = "/work", deadline: float = None):
+    """Call every configured backend concurrently; returns partial results at the deadline"""
+    result = await fanout.fetch(path, deadline=deadline)
+    result["backends"] = fanout.stats()
+    return result
+
+
+class QARequest(BaseModel):
+    question: str
+    context: str
+
+
+class SummarizeRequest(BaseModel):
+    text: str
+
+
+class InferenceItem(BaseModel):
+    task: str  # "qa" or "summarize"
+    question: str = ""
+    context: str = ""
+    text: str = ""
+
+
+class StreamRequest(BaseModel):
+    items: list[InferenceItem]
+
+
+def answer(question: str, context: str):
+    result = models.get("qa")(question=question, context=context)
+    return {"answer": result["answer"], "score": result["score"]}
+
+
+def summarize(text: str):
+    return {"summary": summarize_document(text, models.get("summarizer"))}
+
+
+def run_item(item: InferenceItem):
+    if item.task == "qa":
+        return answer(item.question, item.context)
+    return summarize(item.text)
+
+
+@app.post("/qa")
+async def qa(request: QARequest):
+    """Extractive QA, run on the inference pool so the event loop stays free"""
+    return await inference.run(answer, request.question, request.context)
+
+
+@app.post("/summarize")
+async def summarize_text(request: SummarizeRequest):
+    """Map-reduce summary of the text, run on the inference pool"""
+    return await inference.run(summarize, request.text)
+
+
+async def inference_stream(items):
+    """Run every item on the pool and yield each result as soon as it is ready"""
+
+    async def run(index, item):
+        if item.task not in ("qa", "summarize"):
+            return {"index": index, "task": item.task, "error": f"Unknown task '{item.task}'"}
+        start_time = time.time()
+        try:
+            result = await inference.run(run_item, item)
+            return {"index": index, "task": item.task, "response_time": time.time() - start_time, **result}
+        except Overloaded as e:
+            return {"index": index, "task": item.task, "error": str(e), "retry_after": e.retry_after}
+        except asyncio.TimeoutError:
+            return {"index": index, "task": item.task, "error": "Inference timed out"}
+
+    for task in asyncio.as_completed([run(index, item) for index, item in enumerate(items)]):
+        yield json.dumps(await task) + "\n"
+
+
+@app.post("/stream/inference")
+async def stream_inference(request: StreamRequest):
+    """Send QA and summarization results to the frontend as they complete"""
+    return StreamingResponse(inference_stream(request.items), media_type="text/event-stream")
+
+
+@app.get("/inference/stats")
+async def inference_stats():
+    return {**inference.stats(), "models_loaded": [name for name in ("qa", "summarizer") if models.is_loaded(name)]}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Per-stage timings and counters of this worker, in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+
+@app.post("/debug/profiler")
+async def profiler_switch(action: str = "start", interval: float = None):
+    """Start or stop the sampling profiler in this worker; stop returns folded stacks"""
+    if not PROFILER_ENDPOINTS:
+        raise HTTPException(status_code=404)
+    if action == "start":
+        profiler.start(interval)
+        return profiler.report()
+    return profiler.stop()
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import metrics
+
+# Inference threads per worker process; PyTorch releases the GIL inside its kernels
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+# Requests allowed to wait for a free inference thread before new ones are shed with a 429
+INFERENCE_QUEUE_DEPTH = int(os.environ.get("INFERENCE_QUEUE_DEPTH", "16"))
+# Seconds a request may wait and run before it is answered with a 504
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", "30"))
+
+
+class Overloaded(Exception):
+    """Raised when the inference queue is full; carries a Retry-After estimate in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class InferencePool:
+    """Runs blocking model calls on a bounded thread pool without blocking the event loop.
+
+    At most ``max_workers`` calls run at once and ``max_queue`` more may wait;
+    beyond that, ``run`` raises Overloaded immediately instead of queueing.
+    Admission is counted on the event loop, so no lock is needed.
+    """
+
+    def __init__(self, max_workers: int = INFERENCE_WORKERS, max_queue: int = INFERENCE_QUEUE_DEPTH,
+                 timeout: float = INFERENCE_TIMEOUT):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.completed = 0
+        self.shed = 0
+        self.timeouts = 0
+        # Moving average of call durations, for the Retry-After estimate
+        self.average_seconds = 1.0
+
+    def queue_depth(self):
+        """Calls admitted but still waiting for a pool thread."""
+        return max(self.in_flight - self.max_workers, 0)
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained."""
+        backlog = max(self.in_flight - self.max_workers + 1, 1)
+        return max(1, round(backlog * self.average_seconds / self.max_workers))
+
+    async def run(self, function, *args, timeout: float = None):
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.shed += 1
+            raise Overloaded(self.retry_after())
+        loop = asyncio.get_running_loop()
+        start_time = time.perf_counter()
+        self.in_flight += 1
+        future = self.executor.submit(function, *args)
+        # A call that timed out keeps its thread busy until it returns, so its slot is
+        # only released when the thread is done (or the call is cancelled before starting)
+        future.add_done_callback(lambda _: self._on_done(loop, start_time))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _on_done(self, loop, start_time):
+        # Runs on the inference thread; counters are only touched on the event loop
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self._release, start_time)
+
+    def _release(self, start_time):
+        elapsed = time.perf_counter() - start_time
+        self.in_flight -= 1
+        self.completed += 1
+        self.average_seconds = 0.8 * self.average_seconds + 0.2 * elapsed
+        # Queue wait plus run time on the pool
+        metrics.observe("stage_seconds", elapsed, stage="inference_pool")
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth(),
+            "completed": self.completed,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+            "average_seconds": self.average_seconds,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
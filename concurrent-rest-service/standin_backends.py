@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import random
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI
+
+
+def parse_latency(spec: str):
+    """Turn a latency spec into a function returning one delay in seconds.
+
+    ``fixed:0.1``, ``uniform:0.05,0.2``, ``exponential:0.1`` (mean) and
+    ``lognormal:0.05,0.8`` (median, sigma). Appending ``+tail:0.02,1.5`` makes
+    2% of calls take an extra 1.5 seconds, to model a slow replica or GC pause.
+    """
+    base, _, tail = spec.partition("+tail:")
+    kind, _, args = base.partition(":")
+    params = [float(value) for value in args.split(",") if value]
+    if kind == "fixed":
+        sample = lambda: params[0]
+    elif kind == "uniform":
+        sample = lambda: random.uniform(params[0], params[1])
+    elif kind == "exponential":
+        sample = lambda: random.expovariate(1 / params[0])
+    elif kind == "lognormal":
+        sample = lambda: random.lognormvariate(0, params[1]) * params[0]
+    else:
+        raise ValueError(f"Unknown latency distribution '{kind}'")
+    if not tail:
+        return sample
+    probability, extra = (float(value) for value in tail.split(","))
+    return lambda: sample() + (extra if random.random() < probability else 0.0)
+
+
+def make_backend(name: str, latency: str):
+    """A stand-in downstream service whose /work endpoint sleeps for a sampled latency."""
+    backend = FastAPI()
+    sample = parse_latency(latency)
+
+    @backend.get("/work")
+    async def work(item: str = ""):
+        delay = sample()
+        await asyncio.sleep(delay)
+        return {"service": name, "item": item, "latency": delay, "timestamp": time.time()}
+
+    return backend
+
+
+def serve_in_thread(app, port: int, host: str = "127.0.0.1"):
+    """Run an app on its own uvicorn server in a daemon thread; returns the server."""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def main():
+    """Serve stand-in backends on consecutive ports, e.g. ``lognormal:0.05,0.6 uniform:0.02,0.3``."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("latencies", nargs="+", help="one latency spec per backend")
+    parser.add_argument("--port", type=int, default=9001, help="port of the first backend")
+    args = parser.parse_args()
+
+    for i, latency in enumerate(args.latencies):
+        serve_in_thread(make_backend(f"backend{i + 1}", latency), args.port + i)
+        print(f"backend{i + 1}: http://127.0.0.1:{args.port + i}/work ({latency})")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import io
+import os
+import time
+from collections import Counter
+
+import torch
+
+# "int8" applies dynamic quantization to the Linear layers; "fp32" leaves models as they are
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "fp32").lower()
+# Threads per worker process; unset leaves PyTorch's defaults alone
+INTRA_OP_THREADS = os.environ.get("TORCH_INTRA_OP_THREADS")
+INTER_OP_THREADS = os.environ.get("TORCH_INTER_OP_THREADS")
+
+_threads_configured = False
+
+
+def configure_threads(intra_op=INTRA_OP_THREADS, inter_op=INTER_OP_THREADS):
+    """Set PyTorch's intra-op and inter-op thread counts once per process."""
+    global _threads_configured
+    if _threads_configured:
+        return
+    _threads_configured = True
+    if intra_op:
+        torch.set_num_threads(int(intra_op))
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(int(inter_op))
+        except RuntimeError as e:
+            # Only allowed before the first inter-op parallel work in the process
+            print(f"Could not set inter-op threads: {e}")
+
+
+def model_size_mb(model):
+    """Serialized size of a model's weights, which also counts packed int8 weights."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def quantize_int8(model):
+    """Dynamically quantize the model's Linear layers to int8 weights."""
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class InferencePipeline:
+    """Wraps a transformers pipeline so every call runs under ``torch.inference_mode``."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def __call__(self, *args, **kwargs):
+        with torch.inference_mode():
+            return self.pipeline(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.pipeline, name)
+
+
+def optimize_for_cpu(pipeline, mode=INFERENCE_MODE):
+    """Apply the configured CPU inference mode to a freshly loaded pipeline."""
+    configure_threads()
+    if mode == "int8":
+        before = model_size_mb(pipeline.model)
+        pipeline.model = quantize_int8(pipeline.model)
+        print(f"Quantized {type(pipeline.model).__name__} to int8: {before:.0f} MB -> {model_size_mb(pipeline.model):.0f} MB")
+    elif mode != "fp32":
+        raise ValueError(f"Unknown INFERENCE_MODE '{mode}', expected 'fp32' or 'int8'")
+    pipeline.model.eval()
+    return InferencePipeline(pipeline)
+
+
+def token_f1(prediction, reference):
+    """Unigram F1 between two strings, as used for SQuAD answers."""
+    predicted, expected = prediction.lower().split(), reference.lower().split()
+    common = sum((Counter(predicted) & Counter(expected)).values())
+    if not common:
+        return float(predicted == expected)
+    precision, recall = common / len(predicted), common / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+
+SAMPLE_CONTEXT = (
+    "NVIDIA was founded in 1993 by Jensen Huang, Chris Malachowsky and Curtis Priem. "
+    "The company is headquartered in Santa Clara, California. It designs graphics processing "
+    "units for gaming and professional markets, as well as system on a chip units for the "
+    "mobile computing and automotive market. Revenue for the fourth quarter was a record, "
+    "driven by strong demand for data center products built on the Hopper architecture."
+)
+SAMPLE_QUESTIONS = [
+    "When was NVIDIA founded?",
+    "Who founded NVIDIA?",
+    "Where is NVIDIA headquartered?",
+    "What drove fourth quarter revenue?",
+    "What does the company design?",
+]
+
+
+def _answers(pipe):
+    results = pipe(question=SAMPLE_QUESTIONS, context=[SAMPLE_CONTEXT] * len(SAMPLE_QUESTIONS))
+    return [result["answer"] for result in results]
+
+
+def _summaries(pipe):
+    results = pipe([SAMPLE_CONTEXT], max_length=60, min_length=10, num_beams=1, do_sample=False)
+    return [result["summary_text"] for result in results]
+
+
+def _timed(function, repeats):
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        outputs = function()
+    return outputs, (time.perf_counter() - start_time) / repeats
+
+
+def accuracy_check(names=("qa", "summarizer"), repeats=3):
+    """Compare int8 answers and summaries against fp32 on a small sample set.
+
+    Reports latency, model size and agreement (token F1 against the fp32 output).
+    """
+    from model_registry import load_model
+
+    report = {}
+    for name in names:
+        reference = load_model(name, inference_mode="fp32")
+        quantized = load_model(name, inference_mode="int8")
+        run = _answers if name == "qa" else _summaries
+        expected, fp32_seconds = _timed(lambda: run(reference), repeats)
+        actual, int8_seconds = _timed(lambda: run(quantized), repeats)
+        agreement = sum(token_f1(a, e) for a, e in zip(actual, expected)) / len(expected)
+        report[name] = {
+            "fp32_ms": fp32_seconds * 1000,
+            "int8_ms": int8_seconds * 1000,
+            "speedup": fp32_seconds / int8_seconds if int8_seconds else 0.0,
+            "fp32_mb": model_size_mb(reference.model),
+            "int8_mb": model_size_mb(quantized.model),
+            "agreement_f1": agreement,
+        }
+    return report
+
+
+def main():
+    """Check int8 quality and speed against fp32 on the sample set."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--models", nargs="+", default=["qa", "summarizer"], choices=["qa", "summarizer"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--min-agreement", type=float, default=0.8, help="fail below this token F1 vs fp32")
+    args = parser.parse_args()
+
+    report = accuracy_check(args.models, args.repeats)
+    failed = False
+    for name, stats in report.items():
+        print(
+            f"{name:>10}: fp32 {stats['fp32_ms']:.0f} ms / {stats['fp32_mb']:.0f} MB, "
+            f"int8 {stats['int8_ms']:.0f} ms / {stats['int8_mb']:.0f} MB "
+            f"({stats['speedup']:.2f}x), agreement F1 {stats['agreement_f1']:.2f}"
+        )
+        failed = failed or stats["agreement_f1"] < args.min_agreement
+    if failed:
+        raise SystemExit(f"int8 agreement below {args.min_agreement}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+# Estimated Jaccard similarity of word shingles above which two chunks count as the same
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.85"))
+# Words per shingle, MinHash permutations, and LSH bands (permutations are split evenly across them)
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+LSH_BANDS = 16
+# Modulus of the universal hash family: the Mersenne prime 2**61 - 1
+_PRIME = np.uint64((1 << 61) - 1)
+
+WORD_RE = re.compile(r"\w+")
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """Hashes of the overlapping ``size``-word shingles of the case-folded text."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return np.array([zlib.crc32(" ".join(words).encode("utf-8"))], dtype=np.uint64)
+    return np.fromiter(
+        (zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)),
+        dtype=np.uint64,
+    )
+
+
+class MinHasher:
+    """MinHash signatures: the minimum of each of ``num_perm`` random hash functions over a text's shingles."""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        # Below 2**31, so a * crc32 + b stays inside uint64
+        self.a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)[:, None]
+
+    def signature(self, text):
+        return ((self.a * shingles(text)[None, :] + self.b) % _PRIME).min(axis=1)
+
+
+class Deduplicator:
+    """Runs a model over chunk texts once per cluster of exact or near duplicates.
+
+    Each new chunk is compared with the representatives seen so far: identical
+    text (after case-folding and collapsing whitespace) is found by hash, and
+    near duplicates by MinHash signatures bucketed with LSH, then confirmed by
+    their estimated Jaccard similarity. The first chunk of a cluster is its
+    representative; the others reuse its result. Model time is measured per
+    representative, so the report can estimate the time skipped.
+    """
+
+    def __init__(self, name="chunks", threshold=DEDUP_THRESHOLD, num_perm=NUM_PERM, bands=LSH_BANDS):
+        self.name = name
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(self.rows * bands)
+        self.exact = {}
+        self.buckets = {}
+        self.signatures = []
+        self.results = []
+        self.chunks = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.model_seconds = 0.0
+
+    def _representative(self, text):
+        """Index of the representative for the text, adding it as a new one if it has none."""
+        key = hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).digest()
+        representative = self.exact.get(key)
+        if representative is not None:
+            self.exact_duplicates += 1
+            return representative
+        signature = self.hasher.signature(text)
+        bands = [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+        candidates = {candidate for band in bands for candidate in self.buckets.get(band, ())}
+        best, best_similarity = None, self.threshold
+        for candidate in sorted(candidates):
+            similarity = float(np.mean(self.signatures[candidate] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        if best is not None:
+            self.exact[key] = best
+            self.near_duplicates += 1
+            return best
+        representative = len(self.signatures)
+        self.signatures.append(signature)
+        self.results.append(None)
+        self.exact[key] = representative
+        for band in bands:
+            self.buckets.setdefault(band, []).append(representative)
+        return representative
+
+    def map(self, texts, function):
+        """``function(texts)`` for a batch of chunks, calling it only on chunks not seen before."""
+        texts = list(texts)
+        self.chunks += len(texts)
+        representatives = [self._representative(text) for text in texts]
+        todo = {}
+        for representative, text in zip(representatives, texts):
+            if self.results[representative] is None and representative not in todo:
+                todo[representative] = text
+        if todo:
+            start_time = time.perf_counter()
+            for representative, result in zip(todo, function(list(todo.values()))):
+                self.results[representative] = result
+            self.model_seconds += time.perf_counter() - start_time
+        return [self.results[representative] for representative in representatives]
+
+    def report(self):
+        unique = len(self.signatures)
+        reused = self.chunks - unique
+        seconds_per_chunk = self.model_seconds / unique if unique else 0.0
+        return {
+            "chunks": self.chunks,
+            "unique": unique,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "model_seconds": self.model_seconds,
+            # Duplicates would have cost about as much as the chunks that were run
+            "saved_seconds": reused * seconds_per_chunk,
+        }
+
+    def summary(self):
+        report = self.report()
+        return (
+            f"Dedup ({self.name}): {report['chunks']} chunks, {report['unique']} unique "
+            f"({report['exact_duplicates']} exact and {report['near_duplicates']} near duplicates reused); "
+            f"model time {report['model_seconds']:.1f}s, about {report['saved_seconds']:.1f}s saved"
+        )
@@ -0,0 +1,162 @@
+import mmap
+import os
+import tempfile
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+# Fraction of the corpus file taken by retired pages above which it is rewritten with live pages only
+COMPACT_DEAD_FRACTION = float(os.environ.get("CORPUS_COMPACT_FRACTION", "0.5"))
+
+# One page of one file; ``offset`` is the character offset of the page in the stream
+PageRecord = namedtuple("PageRecord", ["source", "page", "offset", "text"])
+
+
+def iter_records(pages):
+    """Number a stream of ``(source, page, text)`` tuples with running character offsets."""
+    offset = 0
+    for source, page, text in pages:
+        yield PageRecord(source, page, offset, text)
+        offset += len(text)
+
+
+class Corpus:
+    """Page texts stored back to back in one UTF-8 file, memory-mapped for reading.
+
+    A compact NumPy index records each page's source, page number and where it
+    starts in characters and in bytes, so a page or a character span is found
+    with a binary search and decoded on its own, without ever building the
+    corpus as one string. Pages are only appended; replacing a file retires its
+    old pages and appends the new ones, so spans held by readers stay valid.
+    The space of retired pages is reclaimed by ``compacted()``, which copies the
+    live pages into a new Corpus and leaves this one untouched for its readers.
+    """
+
+    def __init__(self, path=None):
+        # Without a path the text lives in an anonymous temporary file
+        self.file = open(path, "w+b") if path else tempfile.TemporaryFile()
+        self.path = path
+        self.sources = []
+        self.source_ids = {}
+        self.page_source = np.empty(0, dtype=np.int32)
+        self.page_number = np.empty(0, dtype=np.int32)
+        self.live = np.empty(0, dtype=bool)
+        # n_pages + 1 cumulative offsets; page i spans [offsets[i], offsets[i + 1])
+        self.char_offsets = np.zeros(1, dtype=np.int64)
+        self.byte_offsets = np.zeros(1, dtype=np.int64)
+        self.mapped = None
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return int(self.live.sum())
+
+    @property
+    def total_chars(self):
+        return int(self.char_offsets[-1])
+
+    def append(self, pages):
+        """Stream ``(source, page, text)`` tuples (or PageRecords) onto the end of the corpus.
+
+        Returns the range of page ids that were added.
+        """
+        with self.lock:
+            first = len(self.page_source)
+            page_sources, page_numbers, chars, sizes = [], [], [], []
+            self.file.seek(0, os.SEEK_END)
+            for record in pages:
+                source, page, text = record[0], record[1], record[-1]
+                data = text.encode("utf-8")
+                self.file.write(data)
+                source_id = self.source_ids.get(source)
+                if source_id is None:
+                    source_id = self.source_ids[source] = len(self.sources)
+                    self.sources.append(source)
+                page_sources.append(source_id)
+                page_numbers.append(page)
+                chars.append(len(text))
+                sizes.append(len(data))
+            self.file.flush()
+            if self.file.tell():
+                # Map the grown file before publishing offsets that point into it
+                self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.page_source = np.concatenate([self.page_source, np.array(page_sources, dtype=np.int32)])
+            self.page_number = np.concatenate([self.page_number, np.array(page_numbers, dtype=np.int32)])
+            self.live = np.concatenate([self.live, np.ones(len(page_sources), dtype=bool)])
+            self.char_offsets = np.concatenate([self.char_offsets, self.char_offsets[-1] + np.cumsum(chars, dtype=np.int64)])
+            self.byte_offsets = np.concatenate([self.byte_offsets, self.byte_offsets[-1] + np.cumsum(sizes, dtype=np.int64)])
+            return range(first, len(self.page_source))
+
+    def retire(self, sources):
+        """Mark every page of the given sources as no longer part of the corpus."""
+        ids = [self.source_ids[source] for source in sources if source in self.source_ids]
+        if ids:
+            self.live = self.live & ~np.isin(self.page_source, ids)
+
+    def dead_fraction(self):
+        """Fraction of the file's bytes that belong to retired pages."""
+        total = int(self.byte_offsets[-1])
+        if not total:
+            return 0.0
+        return float(np.diff(self.byte_offsets)[~self.live].sum()) / total
+
+    def compacted(self):
+        """A new Corpus holding only the live pages, and the new id of every old page (-1 if retired).
+
+        A file-backed corpus is written next to its file and renamed over it;
+        readers of this one keep the old file through their open mapping.
+        """
+        live_ids = np.flatnonzero(self.live)
+        compact = Corpus(f"{self.path}.compact" if self.path else None)
+        compact.append((record.source, record.page, record.text) for record in self.records())
+        if self.path:
+            os.replace(compact.path, self.path)
+            compact.path = self.path
+        remap = np.full(len(self.live), -1, dtype=np.int32)
+        remap[live_ids] = np.arange(len(live_ids), dtype=np.int32)
+        return compact, remap
+
+    def replace(self, sources, pages):
+        """Retire the current pages of ``sources`` and append ``pages`` in their place.
+
+        Returns the range of page ids that were added.
+        """
+        self.retire(sources)
+        return self.append(pages)
+
+    def page_text(self, page_id):
+        mapped = self.mapped
+        start, end = self.byte_offsets[page_id], self.byte_offsets[page_id + 1]
+        return mapped[start:end].decode("utf-8") if end > start else ""
+
+    def source(self, page_id):
+        return self.sources[self.page_source[page_id]]
+
+    def span(self, start, end):
+        """Text between two corpus character offsets, decoding only the pages it covers."""
+        first = int(np.searchsorted(self.char_offsets, start, side="right")) - 1
+        last = int(np.searchsorted(self.char_offsets, end, side="left"))
+        text = "".join(self.page_text(page_id) for page_id in range(first, last))
+        base = int(self.char_offsets[first])
+        return text[start - base:end - base]
+
+    def records(self, page_ids=None):
+        """Yield a PageRecord for each live page, reading one page at a time."""
+        for _, record in self.numbered_records(page_ids):
+            yield record
+
+    def numbered_records(self, page_ids=None):
+        """Like records(), but yields ``(page_id, record)`` pairs."""
+        live = self.live
+        for page_id in (range(len(live)) if page_ids is None else page_ids):
+            if live[page_id]:
+                yield page_id, PageRecord(
+                    self.source(page_id),
+                    int(self.page_number[page_id]),
+                    int(self.char_offsets[page_id]),
+                    self.page_text(page_id),
+                )
+
+    def close(self):
+        self.mapped = None
+        self.file.close()
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from cpu_inference import configure_threads
+
+EMBEDDING_DIR = os.environ.get("EMBEDDING_DIR", "embeddings")
+# float16 halves the store on disk and in the page cache; vectors are returned as float32
+EMBEDDING_DTYPE = os.environ.get("EMBEDDING_DTYPE", "float32")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+
+VECTORS_NAME = "vectors.npy"
+# One hex content hash per line; line i is row i of the vectors file
+KEYS_NAME = "keys.txt"
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Append-only store of vectors keyed by text hash, kept in a memory-mapped .npy file.
+
+    Rows are written to the vectors file before their key is appended to the
+    keys file, so a reader that opens the store from another process (even
+    while it is being written) only ever sees complete rows, and maps them
+    without loading the file into RAM.
+    """
+
+    def __init__(self, directory=EMBEDDING_DIR, dtype=EMBEDDING_DTYPE, readonly=False):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.readonly = readonly
+        self.vectors_path = os.path.join(directory, VECTORS_NAME)
+        self.keys_path = os.path.join(directory, KEYS_NAME)
+        self.rows = {}
+        self.vectors = None
+        self.lock = threading.Lock()
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+        self.refresh()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def refresh(self):
+        """Pick up rows appended since the store was opened (e.g. by another process)."""
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, "r", encoding="ascii") as file:
+            for row, line in enumerate(file):
+                if row >= len(self.rows) and line.endswith("\n"):
+                    self.rows[line.strip()] = row
+        if os.path.exists(self.vectors_path):
+            self.vectors = np.load(self.vectors_path, mmap_mode="r" if self.readonly else "r+")
+
+    def get(self, keys):
+        """float32 matrix of the vectors stored under ``keys``, in order."""
+        rows = [self.rows[key] for key in keys]
+        if self.vectors is None:
+            # Nothing stored yet, so the dimension is unknown too
+            return np.empty((0, 0), dtype=np.float32)
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+    def add(self, keys, vectors):
+        """Append vectors for keys that are not stored yet."""
+        if self.readonly:
+            raise ValueError("EmbeddingStore was opened read-only")
+        vectors = np.asarray(vectors)
+        with self.lock:
+            fresh = [i for i, key in enumerate(keys) if key not in self.rows]
+            if not fresh:
+                return
+            start = len(self.rows)
+            self._reserve(start + len(fresh), vectors.shape[1])
+            self.vectors[start:start + len(fresh)] = vectors[fresh].astype(self.dtype)
+            self.vectors.flush()
+            with open(self.keys_path, "a", encoding="ascii") as file:
+                file.write("".join(f"{keys[i]}\n" for i in fresh))
+            for offset, i in enumerate(fresh):
+                self.rows[keys[i]] = start + offset
+
+    def _reserve(self, rows, dim):
+        # Capacity doubles when full, so appends copy the file only O(log n) times
+        if self.vectors is not None and len(self.vectors) >= rows:
+            return
+        capacity = max(rows, 1024, 2 * (len(self.vectors) if self.vectors is not None else 0))
+        tmp_path = f"{self.vectors_path}.{os.getpid()}.tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(capacity, dim))
+        if self.vectors is not None:
+            grown[:len(self.rows)] = self.vectors[:len(self.rows)]
+        grown.flush()
+        del grown
+        os.replace(tmp_path, self.vectors_path)
+        self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain embeddings that batch, length-sort and deduplicate before embedding.
+
+    Each distinct chunk text is embedded once: texts already in the store (such
+    as headers and footers repeated across PDFs) are looked up, and the rest are
+    sorted by length so each batch pads to similar lengths. With a
+    ``dedup.Deduplicator``, near duplicates of a chunk embedded in this run
+    (boilerplate differing in a date or page number) reuse its vector too.
+    """
+
+    def __init__(self, base, store=None, batch_size=EMBEDDING_BATCH_SIZE, dedup=None):
+        self.base = base
+        self.store = store if store is not None else EmbeddingStore()
+        self.batch_size = batch_size
+        self.dedup = dedup
+        self.embedded = 0
+        self.reused = 0
+        self.seconds = 0.0
+        configure_threads()
+
+    def embed_documents(self, texts):
+        keys = [text_hash(text) for text in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.store and key not in missing:
+                missing[key] = text
+        self.reused += len(texts) - len(missing)
+        if missing:
+            start_time = time.perf_counter()
+            pending = sorted(missing.items(), key=lambda item: len(item[1]))
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                texts_batch = [text for _, text in batch]
+                if self.dedup is not None:
+                    vectors = self.dedup.map(texts_batch, self.base.embed_documents)
+                else:
+                    vectors = self.base.embed_documents(texts_batch)
+                self.store.add([key for key, _ in batch], vectors)
+            elapsed = time.perf_counter() - start_time
+            self.seconds += elapsed
+            self.embedded += len(pending)
+            print(
+                f" Embedded {len(pending)} new chunks in {elapsed:.1f}s "
+                f"({len(pending) / elapsed:.1f} chunks/s); reused {len(texts) - len(pending)}"
+            )
+        return self.store.get(keys).tolist()
+
+    def embed_query(self, text):
+        return self.base.embed_query(text)
@@ -0,0 +1,184 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfReader
+from bs4 import BeautifulSoup
+
+from instrumentation import metrics
+
+# Bump whenever a reader changes its output so cached extractions are redone
+EXTRACTOR_VERSION = 2
+# Worker processes used for extraction; 1 extracts in the calling process
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+# PDFs with more pages than this are split into page ranges across workers
+PAGES_PER_TASK = int(os.environ.get("EXTRACT_PAGES_PER_TASK", "50"))
+# Only PDFs at least this large are opened up front to count their pages
+SPLIT_PDF_BYTES = int(os.environ.get("EXTRACT_SPLIT_PDF_BYTES", str(2 * 1024 * 1024)))
+
+
+def read_pdf(file_path, start_page=0, end_page=None):
+    """Read the text content from a PDF file, optionally only a page range."""
+    return "".join(read_pdf_pages(file_path, start_page, end_page))
+
+
+def read_pdf_pages(file_path, start_page=0, end_page=None):
+    """Read the text of each page of a PDF file, optionally only a page range."""
+    pages = []
+    try:
+        reader = PdfReader(file_path)
+        for page in reader.pages[start_page:end_page]:
+            pages.append(page.extract_text())
+    except Exception as e:
+        print(f"Error reading PDF {file_path}: {e}")
+    return pages
+
+
+def read_html(file_path):
+    """Read the text content from an HTML file."""
+    text = ""
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            soup = BeautifulSoup(file, "html.parser")
+            text = soup.get_text()
+    except Exception as e:
+        print(f"Error reading HTML {file_path}: {e}")
+    return text
+
+
+def read_text(file_path):
+    """Read the text content from a plain text file."""
+    text = ""
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            text = file.read()
+    except Exception as e:
+        print(f"Error reading text file {file_path}: {e}")
+    return text
+
+
+def count_pdf_pages(file_path):
+    """Number of pages in a PDF, or 0 if it cannot be opened."""
+    try:
+        return len(PdfReader(file_path).pages)
+    except Exception as e:
+        print(f"Error reading PDF {file_path}: {e}")
+        return 0
+
+
+def list_files(content, verbose=True):
+    """Supported files under the folder as ``(source, path)`` pairs, in a stable order."""
+    found = []
+    for root, dirs, files in os.walk(content):
+        dirs.sort()
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            if file.lower().endswith((".pdf", ".html", ".htm", ".txt")):
+                found.append((os.path.relpath(file_path, content), file_path))
+            elif verbose:
+                print(f"Skipping unsupported file: {file}")
+    return found
+
+
+def plan_tasks(files, pages_per_task=PAGES_PER_TASK, split_pdf_bytes=SPLIT_PDF_BYTES):
+    """Turn files into extraction tasks ``(source, path, start_page, end_page)``.
+
+    Small files become one task each; large PDFs are cut into consecutive page
+    ranges so a single huge document can be spread over several workers.
+    """
+    tasks = []
+    for source, file_path in files:
+        if file_path.lower().endswith(".pdf") and os.path.getsize(file_path) >= split_pdf_bytes:
+            page_count = count_pdf_pages(file_path)
+            if page_count > pages_per_task:
+                for start in range(0, page_count, pages_per_task):
+                    tasks.append((source, file_path, start, min(start + pages_per_task, page_count)))
+                continue
+        tasks.append((source, file_path, 0, None))
+    return tasks
+
+
+def extract_task(task):
+    """Extract one task, returning the text of each page it covers.
+
+    HTML and text files have no pages and come back as a single one.
+    """
+    source, file_path, start_page, end_page = task
+    lower = file_path.lower()
+    if lower.endswith(".pdf"):
+        return read_pdf_pages(file_path, start_page, end_page)
+    if lower.endswith((".html", ".htm")):
+        return [read_html(file_path)]
+    return [read_text(file_path)]
+
+
+def _pool_context():
+    # Workers only need the reader functions above, so fork them directly rather
+    # than re-importing the calling script (which may load models at import).
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def _can_fork():
+    # Forking a process with other threads running (a server, a folder watcher) can leave
+    # locks they hold locked forever in the children, so such processes extract in-process
+    return threading.active_count() == 1
+
+
+def extract_folder(content, workers=EXTRACT_WORKERS, pages_per_task=PAGES_PER_TASK):
+    """Extract every supported file in the folder, in parallel across processes.
+
+    Returns a dict mapping each file's path relative to the folder to the list
+    of its page texts. Page ranges of split PDFs are put back in page order.
+    """
+    return dict(iter_extracted(list_files(content), workers=workers, pages_per_task=pages_per_task))
+
+
+def iter_extracted(files, workers=EXTRACT_WORKERS, pages_per_task=PAGES_PER_TASK):
+    """Extract ``(source, path)`` pairs in parallel, yielding ``(source, pages)`` per file.
+
+    Files are yielded in order as soon as all of their pages are in, so callers
+    can store each one and drop it instead of holding the whole corpus.
+    """
+    start_time = time.perf_counter()
+    tasks = plan_tasks(files, pages_per_task=pages_per_task)
+    stats = {"files": 0, "pages": 0}
+
+    if workers <= 1 or len(tasks) <= 1 or not _can_fork():
+        workers = 1
+        yield from _group_pages(tasks, map(extract_task, tasks), stats)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as executor:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            results = executor.map(extract_task, tasks, chunksize=chunksize)
+            yield from _group_pages(tasks, results, stats)
+
+    elapsed = time.perf_counter() - start_time
+    rate = stats["pages"] / elapsed if elapsed > 0 else 0.0
+    # Work happens in worker processes, so the whole run is recorded from here
+    metrics.observe("stage_seconds", elapsed, stage="extract")
+    metrics.inc("extracted_pages_total", stats["pages"])
+    print(
+        f"Extracted {stats['pages']} pages from {stats['files']} files in {elapsed:.2f}s "
+        f"({rate:.1f} pages/s, {workers} workers)"
+    )
+
+
+def _group_pages(tasks, results, stats):
+    # Tasks are planned in page order and map() yields in task order, so the
+    # page ranges of a split PDF arrive one after another.
+    current, pages = None, []
+    for (source, _, _, _), task_pages in zip(tasks, results):
+        stats["pages"] += len(task_pages)
+        if source != current:
+            if current is not None:
+                stats["files"] += 1
+                yield current, pages
+            current, pages = source, []
+        pages.extend(task_pages)
+    if current is not None:
+        stats["files"] += 1
+        yield current, pages
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import threading
+import traceback
+
+from documents import iter_records
+from extraction import EXTRACTOR_VERSION, EXTRACT_WORKERS, iter_extracted, list_files
+
+# Directory holding extracted text blobs and the manifest describing them
+CACHE_DIR = os.environ.get("EXTRACT_CACHE_DIR", ".extract_cache")
+MANIFEST_NAME = "manifest.json"
+# Separates the pages of a file inside its cached blob
+PAGE_BREAK = "\f"
+
+
+def file_hash(file_path, block_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """On-disk cache of extracted text keyed by file content hash and extractor version.
+
+    The manifest remembers the size, mtime and hash of every file seen, so an
+    unchanged file is recognised from ``os.stat`` alone and its pages are read
+    back from the cache instead of being parsed again. Files whose content
+    changed are re-extracted, and files that disappeared are evicted.
+    Several processes may share the cache directory, each syncing its own
+    folder: a sync only rewrites and evicts the entries of the folder it
+    synced, and keeps the ones other processes saved for other folders.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, workers=EXTRACT_WORKERS):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        # path -> (source, hash) as of the last sync, to report what changed since
+        self.synced = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        # Entries written by another extractor version point at stale blobs
+        return {
+            path: entry for path, entry in manifest.items()
+            if entry.get("version") == EXTRACTOR_VERSION
+        }
+
+    def _save_manifest(self, folder):
+        # Entries of other folders are taken from disk, as another process may have synced them since
+        on_disk = self._load_manifest()
+        self.manifest = {
+            **{key: entry for key, entry in on_disk.items() if not key.startswith(folder)},
+            **{key: entry for key, entry in self.manifest.items() if key.startswith(folder)},
+        }
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.manifest, file)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _blob_path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}-v{EXTRACTOR_VERSION}.txt")
+
+    def read_pages(self, digest):
+        """The cached page texts of the file with this content hash, or None."""
+        try:
+            with open(self._blob_path(digest), "r", encoding="utf-8", newline="") as file:
+                return file.read().split(PAGE_BREAK)
+        except OSError:
+            return None
+
+    def _write_pages(self, digest, pages):
+        blob_path = self._blob_path(digest)
+        tmp_path = f"{blob_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as file:
+            file.write(PAGE_BREAK.join(page.replace(PAGE_BREAK, "\n") for page in pages))
+        os.replace(tmp_path, blob_path)
+
+    def _folder_entries(self, content):
+        folder = os.path.join(os.path.abspath(content), "")
+        entries = [(key, entry) for key, entry in self.manifest.items() if key.startswith(folder)]
+        return sorted(entries, key=lambda item: item[1]["source"])
+
+    def sync(self, content, verbose=True):
+        """Bring the cache in line with the folder on disk.
+
+        Only new or modified files are extracted. Returns the sources that changed
+        and the sources that were removed since this cache last synced the folder,
+        so the first call reports every file as changed.
+        """
+        folder = os.path.join(os.path.abspath(content), "")
+        with self.lock:
+            previous_hashes = {entry["hash"] for key, entry in self.manifest.items() if key.startswith(folder)}
+            files = list_files(content, verbose=verbose)
+            present = {}
+            to_extract, queued = [], set()
+            for source, file_path in files:
+                key = os.path.abspath(file_path)
+                stat = os.stat(file_path)
+                entry = self.manifest.get(key)
+                if not (entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                        and entry["source"] == source and os.path.exists(self._blob_path(entry["hash"]))):
+                    entry = {
+                        "hash": file_hash(file_path),
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns,
+                        "source": source,
+                        "version": EXTRACTOR_VERSION,
+                    }
+                    self.manifest[key] = entry
+                    # Identical copies of a file share one blob and are extracted once
+                    if not os.path.exists(self._blob_path(entry["hash"])) and entry["hash"] not in queued:
+                        queued.add(entry["hash"])
+                        to_extract.append((source, file_path))
+                present[key] = entry
+
+            if to_extract:
+                hashes = {source: self.manifest[os.path.abspath(path)]["hash"] for source, path in to_extract}
+                for source, pages in iter_extracted(to_extract, workers=self.workers):
+                    self._write_pages(hashes[source], pages)
+
+            for key in [key for key in self.manifest if key.startswith(folder) and key not in present]:
+                del self.manifest[key]
+            changed = [
+                entry["source"] for key, entry in present.items()
+                if self.synced.get(key) != (entry["source"], entry["hash"])
+            ]
+            removed = [
+                source for key, (source, _) in self.synced.items()
+                if key.startswith(folder) and key not in present
+            ]
+            for key in [key for key in self.synced if key.startswith(folder)]:
+                del self.synced[key]
+            self.synced.update((key, (entry["source"], entry["hash"])) for key, entry in present.items())
+
+            self._save_manifest(folder)
+            self._evict_unreferenced(previous_hashes)
+        return changed, removed
+
+    def hashes(self, content):
+        """Content hash of every file in the folder, keyed by source."""
+        return {entry["source"]: entry["hash"] for _, entry in self._folder_entries(content)}
+
+    def iter_pages(self, content, sources=None):
+        """Stream PageRecords for the folder (or only ``sources``), one file in memory at a time."""
+        wanted = set(sources) if sources is not None else None
+
+        def pages():
+            for _, entry in self._folder_entries(content):
+                if wanted is not None and entry["source"] not in wanted:
+                    continue
+                for page, text in enumerate(self.read_pages(entry["hash"]) or []):
+                    yield entry["source"], page, text
+
+        return iter_records(pages())
+
+    def _evict_unreferenced(self, candidates):
+        """Delete blobs of the given hashes that no manifest entry uses any more, and blobs of other extractor versions."""
+        referenced = {entry["hash"] for entry in self.manifest.values()}
+        stale = {os.path.basename(self._blob_path(digest)) for digest in candidates - referenced}
+        for name in os.listdir(self.cache_dir):
+            if name in stale or (name.endswith(".txt") and not name.endswith(f"-v{EXTRACTOR_VERSION}.txt")):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+
+def watch_folder(cache, content, on_change, interval=5.0):
+    """Poll the folder in a daemon thread and report incremental changes.
+
+    ``on_change(changed, removed)`` is called with the affected sources whenever
+    a file is added, modified or deleted; their pages are already in the cache.
+    """
+    stop = threading.Event()
+
+    def poll():
+        # Changes the callback has not applied yet; kept across polls if it fails
+        pending_changed, pending_removed = set(), set()
+        while not stop.wait(interval):
+            # A failed sync or callback is retried on the next poll instead of ending the thread
+            try:
+                changed, removed = cache.sync(content, verbose=False)
+                pending_changed = (pending_changed - set(removed)) | set(changed)
+                pending_removed = (pending_removed - set(changed)) | set(removed)
+                if pending_changed or pending_removed:
+                    print(f"Contents changed: {len(pending_changed)} updated, {len(pending_removed)} removed")
+                    on_change(sorted(pending_changed), sorted(pending_removed))
+                    pending_changed, pending_removed = set(), set()
+            except Exception:
+                print(f"Error refreshing {content}:\n{traceback.format_exc()}")
+
+    thread = threading.Thread(target=poll, name="contents-watcher", daemon=True)
+    thread.start()
+    return stop
@@ -0,0 +1,106 @@
+import time
+
+import numpy as np
+from transformers import TrainerCallback
+from transformers.trainer_pt_utils import LengthGroupedSampler
+
+# Sequence length the fine-tuning examples are cut and packed to
+MAX_LENGTH = 128
+
+
+def token_windows(token_ids, max_length=MAX_LENGTH, eos_token_id=None):
+    """Cut one page's token IDs into consecutive windows instead of truncating it.
+
+    Every window but the last is full; each ends with the EOS token when one is given.
+    """
+    step = max_length - (1 if eos_token_id is not None else 0)
+    windows = []
+    for start in range(0, len(token_ids), step):
+        window = list(token_ids[start:start + step])
+        if eos_token_id is not None:
+            window.append(eos_token_id)
+        windows.append(window)
+    return windows
+
+
+def pack_sequences(sequences, max_length=MAX_LENGTH):
+    """Concatenate short sequences into as few sequences of at most max_length as possible.
+
+    Best-fit decreasing: longest first, each into the open pack with the least
+    room that still fits it. Packs are bucketed by their remaining room, so a
+    placement scans at most ``max_length`` buckets however many packs are open.
+    Full-length sequences pass through unchanged.
+    """
+    packs = []
+    # by_room[r]: indices of the packs with exactly r tokens of room left
+    by_room = [[] for _ in range(max_length + 1)]
+    for sequence in sorted(sequences, key=len, reverse=True):
+        length = len(sequence)
+        room = next((r for r in range(length, max_length + 1) if by_room[r]), None)
+        if room is None:
+            packs.append(list(sequence))
+            if length < max_length:
+                by_room[max_length - length].append(len(packs) - 1)
+            continue
+        pack = by_room[room].pop()
+        packs[pack].extend(sequence)
+        by_room[room - length].append(pack)
+    return packs
+
+
+def build_examples(texts, tokenizer, max_length=MAX_LENGTH):
+    """Tokenize whole pages into packed ``input_ids``/``labels`` examples with no padding.
+
+    Returns a dict of columns for ``Dataset.from_dict``, including each example's
+    ``length`` for length-grouped batching.
+    """
+    encoded = tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+    windows = [
+        window
+        for token_ids in encoded
+        if token_ids
+        for window in token_windows(token_ids, max_length, tokenizer.eos_token_id)
+    ]
+    full = [window for window in windows if len(window) == max_length]
+    packed = full + pack_sequences([window for window in windows if len(window) < max_length], max_length)
+    return {
+        "input_ids": packed,
+        "attention_mask": [[1] * len(ids) for ids in packed],
+        "labels": [list(ids) for ids in packed],
+        "length": [len(ids) for ids in packed],
+    }
+
+
+def padding_ratio(lengths, batch_size, order=None):
+    """Fraction of the padded batch tensors taken up by padding, batching in ``order``."""
+    lengths = np.asarray(lengths)
+    if order is not None:
+        lengths = lengths[list(order)]
+    padded = real = 0
+    for start in range(0, len(lengths), batch_size):
+        batch = lengths[start:start + batch_size]
+        padded += int(batch.max()) * len(batch)
+        real += int(batch.sum())
+    return 1 - real / padded if padded else 0.0
+
+
+def grouped_padding_ratio(lengths, batch_size):
+    """Padding ratio under the Trainer's length-grouped batch order."""
+    order = LengthGroupedSampler(batch_size, lengths=list(lengths))
+    return padding_ratio(lengths, batch_size, order)
+
+
+class TokenThroughputCallback(TrainerCallback):
+    """Reports real (non-padding) training tokens per second at the end of training."""
+
+    def __init__(self, lengths):
+        self.tokens_per_epoch = int(sum(lengths))
+        self.start_time = None
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self.start_time = time.perf_counter()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        elapsed = time.perf_counter() - self.start_time
+        tokens = self.tokens_per_epoch * state.epoch
+        print(f"Trained on {tokens:.0f} tokens in {elapsed:.1f}s ({tokens / elapsed:.0f} tokens/s)")
@@ -0,0 +1,53 @@
+# Serve the Flask app with several worker processes that share one copy of the models and corpus:
+#   gunicorn -c gunicorn.conf.py
+# The app is imported once in the master (preload_app), so the QA model, the corpus file
+# mapping and the passage index are built before forking and workers start in milliseconds.
+import gc
+import os
+
+# Tells app.py to leave per-process threads (QA batcher) to post_fork
+os.environ.setdefault("SERVE_PRELOAD", "1")
+
+wsgi_app = "app:app"
+preload_app = True
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "4"))
+# Threads per worker; with the QA batcher on, concurrent requests in a worker share model calls
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+# Loading happens before the fork, so workers only need the default timeout for requests
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+# Torch intra-op threads per worker, so workers do not oversubscribe the cores between them
+TORCH_THREADS = int(os.environ.get("WORKER_TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // workers))))
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's generations: a collection in a
+    # worker would otherwise write to the GC headers of preloaded objects and copy their pages
+    gc.freeze()
+    # No threads are started in the master: it forks every worker, respawns included, and a fork
+    # taken while another thread holds a logging or import lock leaves that lock held in the child.
+    # Each worker logs its own memory once it is up (post_worker_init), and keeps reporting it on
+    # /metrics as the process_{rss,pss,private}_bytes gauges.
+
+
+def post_fork(server, worker):
+    import torch
+
+    import app
+
+    torch.set_num_threads(TORCH_THREADS)
+    app.start_background()
+
+
+
+def post_worker_init(worker):
+    from instrumentation import process_memory
+
+    memory = process_memory()
+    if memory:
+        mb = 1024 * 1024
+        worker.log.info(
+            f"worker {worker.pid}: rss {memory['rss'] / mb:.0f} MB, pss {memory['pss'] / mb:.0f} MB, "
+            f"private {memory['private'] / mb:.0f} MB"
+        )
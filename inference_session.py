@@ -0,0 +1,108 @@
+import argparse
+import os
+import threading
+import time
+
+import torch
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+from cpu_inference import configure_threads
+from model_registry import WEIGHT_FILES
+
+MODEL_DIR = "./tiny_model"
+GENERATION_BATCH_SIZE = int(os.environ.get("GENERATION_BATCH_SIZE", "16"))
+MAX_NEW_TOKENS = 100
+
+
+def checkpoint_mtime(model_dir):
+    """Latest modification time of the config and weight files, or None if there are none."""
+    times = [
+        os.path.getmtime(path)
+        for path in (os.path.join(model_dir, name) for name in ("config.json", *WEIGHT_FILES))
+        if os.path.isfile(path)
+    ]
+    return max(times) if times else None
+
+
+class Seq2SeqSession:
+    """Keeps a fine-tuned seq2seq model loaded and generates for lists of prompts.
+
+    The model is loaded on first use and reloaded only when the checkpoint on
+    disk changes (e.g. after another fine-tuning run saves over it).
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, batch_size=GENERATION_BATCH_SIZE):
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.model = None
+        self.tokenizer = None
+        self.loaded_mtime = None
+        self.loads = 0
+        self.lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        mtime = checkpoint_mtime(self.model_dir)
+        if mtime is None:
+            raise FileNotFoundError(f"No model checkpoint in {self.model_dir}")
+        if self.model is not None and mtime == self.loaded_mtime:
+            return
+        start_time = time.perf_counter()
+        configure_threads()
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(self.model_dir).eval()
+        self.loaded_mtime = mtime
+        self.loads += 1
+        print(f"Loaded {self.model_dir} in {time.perf_counter() - start_time:.2f}s")
+
+    def generate(self, prompts, max_new_tokens=MAX_NEW_TOKENS, **generate_kwargs):
+        """Generate for each prompt; outputs are returned in the order of ``prompts``.
+
+        Prompts are batched by token length so each padded batch wastes little.
+        """
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        with self.lock:
+            self._ensure_loaded()
+            lengths = [len(ids) for ids in self.tokenizer(prompts, truncation=True)["input_ids"]]
+            order = sorted(range(len(prompts)), key=lengths.__getitem__)
+            outputs = [None] * len(prompts)
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                inputs = self.tokenizer(
+                    [prompts[i] for i in batch], return_tensors="pt", padding=True, truncation=True
+                )
+                with torch.inference_mode():
+                    generated = self.model.generate(**inputs, max_new_tokens=max_new_tokens, **generate_kwargs)
+                for i, text in zip(batch, self.tokenizer.batch_decode(generated, skip_special_tokens=True)):
+                    outputs[i] = text
+        return outputs
+
+
+def main():
+    """Compare reloading the model per prompt with one batched session."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--prompts", type=int, default=32)
+    parser.add_argument("--max-new-tokens", type=int, default=20)
+    parser.add_argument("--baseline-prompts", type=int, default=4, help="prompts timed with reload-per-call")
+    args = parser.parse_args()
+
+    prompts = [f"What is point {i} of this document?" for i in range(args.prompts)]
+
+    start_time = time.perf_counter()
+    for prompt in prompts[:args.baseline_prompts]:
+        Seq2SeqSession(args.model_dir).generate([prompt], args.max_new_tokens)
+    per_call = (time.perf_counter() - start_time) / max(args.baseline_prompts, 1)
+
+    session = Seq2SeqSession(args.model_dir)
+    session.generate(prompts[:1], args.max_new_tokens)
+    start_time = time.perf_counter()
+    session.generate(prompts, args.max_new_tokens)
+    per_prompt = (time.perf_counter() - start_time) / len(prompts)
+
+    print(f"reload per call: {1 / per_call:.1f} prompts/s")
+    print(f"batched session: {1 / per_prompt:.1f} prompts/s ({per_call / per_prompt:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+import bisect
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds, from 0.5 ms to 30 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds between stack samples of the sampling profiler
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+# Expose the runtime profiler switch over HTTP; off by default since stacks reveal code paths
+PROFILER_ENDPOINTS = os.environ.get("PROFILER_ENDPOINTS", "0").lower() in ("1", "true")
+# Dashboard URL that snapshots are pushed to (e.g. http://localhost:8050/push); empty disables pushing
+METRICS_PUSH_URL = os.environ.get("METRICS_PUSH_URL", "")
+METRICS_PUSH_INTERVAL = float(os.environ.get("METRICS_PUSH_INTERVAL", "1"))
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values for one label set."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Approximate quantile, interpolated linearly within the bucket that holds it."""
+        if not self.count:
+            return 0.0
+        rank, seen, lower = q * self.count, 0, 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.buckets[-1]
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """Counters, histograms and callback gauges, rendered in the Prometheus text format.
+
+    Updates take one short lock and a dict lookup, so timing a stage costs a
+    couple of microseconds. Each process keeps its own values.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.help = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge(self, name, function, help_text=""):
+        """Report ``function()`` as a gauge each time metrics are rendered."""
+        self.gauges[name] = function
+        if help_text:
+            self.help[name] = help_text
+
+    def describe(self, name, help_text):
+        self.help[name] = help_text
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator recording each call's duration."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """Plain dict of every metric, e.g. for dashboards.
+
+        Histograms give count, sum, p50/p95/p99 and their bucket counts, so a
+        reader holding two snapshots can work out quantiles for the interval.
+        """
+        with self.lock:
+            histograms = {
+                (name, labels): (histogram.count, histogram.sum, [histogram.quantile(q) for q in (0.5, 0.95, 0.99)],
+                                 list(histogram.counts))
+                for (name, labels), histogram in self.histograms.items()
+            }
+            counters = dict(self.counters)
+        return {
+            "histograms": [
+                {"name": name, "labels": dict(labels), "count": count, "sum": total,
+                 "p50": quantiles[0], "p95": quantiles[1], "p99": quantiles[2], "buckets": buckets}
+                for (name, labels), (count, total, quantiles, buckets) in histograms.items()
+            ],
+            "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters.items()],
+            "gauges": {name: self._gauge_value(function) for name, function in self.gauges.items()},
+        }
+
+    @staticmethod
+    def _gauge_value(function):
+        try:
+            return float(function())
+        except Exception:
+            return float("nan")
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            histograms = sorted(
+                (name, labels, list(histogram.counts), histogram.sum, histogram.count, histogram.buckets)
+                for (name, labels), histogram in self.histograms.items()
+            )
+            counters = sorted(self.counters.items())
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for name, labels, counts, total, count, buckets in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip((*buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_label_text((*labels, ('le', bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_label_text(labels)} {value}")
+        for name, function in sorted(self.gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{name} {self._gauge_value(function)}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every module in the process
+metrics = MetricsRegistry()
+metrics.describe("stage_seconds", "Time spent in each pipeline stage")
+metrics.describe("http_request_seconds", "HTTP request latency by route")
+
+
+def process_memory(pid="self"):
+    """Resident memory of a process in bytes, from Linux ``/proc/<pid>/smaps_rollup``.
+
+    ``pss`` splits shared pages evenly between the processes mapping them and
+    ``private`` counts pages only this process holds, so for forked workers
+    ``private`` is the real cost of one more worker. Empty where unsupported.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as file:
+            for line in file:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0]) * 1024
+    except OSError:
+        return {}
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+for _field, _help in (
+    ("rss", "Resident memory of this process, shared pages included"),
+    ("pss", "Proportional set size: resident memory with shared pages split between their processes"),
+    ("private", "Memory held by this process alone"),
+):
+    metrics.gauge(f"process_{_field}_bytes", lambda _field=_field: process_memory().get(_field, float("nan")), _help)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def stage(name, **labels):
+    """Context manager timing one pipeline stage into the ``stage_seconds`` histogram."""
+    return metrics.timer("stage_seconds", stage=name, **labels)
+
+
+def _timed_iterator(iterator, name, labels):
+    # Times the work done inside each next(), not the time the consumer holds the item
+    while True:
+        start_time = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        metrics.observe("stage_seconds", time.perf_counter() - start_time, stage=name, **labels)
+        yield item
+
+
+def instrument_pipeline(pipeline, model):
+    """Time a transformers pipeline's tokenize, infer and decode steps per call.
+
+    Wraps the instance's ``preprocess``, ``_forward`` and ``postprocess``; for
+    chunked pipelines (e.g. question answering) whose preprocess is a generator,
+    the time spent producing each chunk is recorded.
+    """
+    for method, name in (("preprocess", "tokenize"), ("_forward", "infer"), ("postprocess", "decode")):
+        original = getattr(pipeline, method)
+
+        def wrapper(*args, _original=original, _name=name, **kwargs):
+            start_time = time.perf_counter()
+            result = _original(*args, **kwargs)
+            if inspect.isgenerator(result):
+                return _timed_iterator(result, _name, {"model": model})
+            metrics.observe("stage_seconds", time.perf_counter() - start_time, stage=_name, model=model)
+            return result
+
+        setattr(pipeline, method, wrapper)
+    return pipeline
+
+
+class SamplingProfiler:
+    """Statistical profiler that samples every thread's stack from a background thread.
+
+    Costs nothing while stopped and can be started and stopped at runtime.
+    Results are folded stacks ("a;b;c count"), ready for flamegraph tools.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self._stop = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        if self.running:
+            return
+        self.interval = interval or self.interval
+        self.stacks.clear()
+        self.samples = 0
+        self.started = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+        return self.report()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self, limit=200):
+        """Status and the most frequent folded stacks."""
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "samples": self.samples,
+            "seconds": time.time() - self.started if self.started else 0.0,
+            "folded": "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common(limit)),
+        }
+
+
+profiler = SamplingProfiler()
+
+
+class MetricsPusher:
+    """Background thread that POSTs this process's metrics snapshot to the dashboard.
+
+    Each push is tagged ``<service>:<pid>``, so every worker shows up on its own.
+    A dashboard that is down only costs a failed request per interval.
+    """
+
+    def __init__(self, service, url=METRICS_PUSH_URL, interval=METRICS_PUSH_INTERVAL, registry=metrics):
+        self.source = f"{service}:{os.getpid()}"
+        self.url = url
+        self.interval = interval
+        self.registry = registry
+        self.pushed = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def push(self):
+        body = json.dumps({"source": self.source, "snapshot": self.registry.snapshot()}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=max(self.interval, 1.0)):
+            pass
+        self.pushed += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-pusher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.push()
+            except OSError as e:
+                if not self.failures:
+                    print(f"Could not push metrics to {self.url}: {e}")
+                self.failures += 1
+
+
+def start_pusher(service):
+    """Start pushing metrics to ``METRICS_PUSH_URL``, if set; call once per process, after any fork."""
+    if not METRICS_PUSH_URL:
+        return None
+    return MetricsPusher(service).start()
@@ -1,37 +1,85 @@
-from dash import Dash, html
+import os
+
+from dash import Dash, Input, Output, State, dcc, html, no_update
 import dash_bootstrap_components as dbc
+from flask import request
+
+from timeseries import TIMESERIES_POINTS, TimeSeriesStore
+
+# Milliseconds between chart refreshes in the browser
+REFRESH_MS = int(os.environ.get("DASHBOARD_REFRESH_MS", "1000"))
 
 # Initialize the Dash app
 app = Dash(__name__, external_stylesheets=[dbc.themes.FLATLY])
 
-# Mock card data
-CARDS = [
-    {
-        "title": "Portfolio Management",
-        "description": "Manage your portfolios effectively with advanced tools and insights.",
-        "link_text": "Learn More",
-        "link_url": "#",
-    },
-    {
-        "title": "Market Insights",
-        "description": "Get the latest market trends, analysis, and expert opinions to stay ahead.",
-        "link_text": "Explore",
-        "link_url": "#",
-    },
-    {
-        "title": "Investment Tools",
-        "description": "Access a range of powerful tools to support your investment decisions.",
-        "link_text": "Try Tools",
-        "link_url": "#",
-    },
-    {
-        "title": "Client Reporting",
-        "description": "Generate detailed, professional client reports effortlessly.",
-        "link_text": "Start Reporting",
-        "link_url": "#",
-    },
+# Services push their metrics here (METRICS_PUSH_URL=http://<host>:8050/push); the series
+# live in this process's memory, so the dashboard runs as a single process
+store = TimeSeriesStore()
+
+
+@app.server.route("/push", methods=["POST"])
+def push():
+    data = request.get_json(force=True)
+    store.push(data["source"], data["snapshot"])
+    return "", 204
+
+
+# Charts: the series they plot (one trace per series and worker) and the factor
+# that turns stored values (seconds, bytes, fractions) into the plotted unit
+CHARTS = [
+    {"id": "request-rate", "title": "Requests per second", "series": ["request_rate"], "scale": 1},
+    {"id": "latency", "title": "Latency p50 / p95 / p99 (ms)",
+     "series": ["latency_p50", "latency_p95", "latency_p99"], "scale": 1000},
+    {"id": "queue-depth", "title": "Queue depth", "series": ["queue_depth"], "scale": 1},
+    {"id": "cache-hit-rate", "title": "Answer cache hit rate (%)", "series": ["cache_hit_rate"], "scale": 100},
+    {"id": "memory", "title": "Memory per worker (PSS, MB)", "series": ["memory_bytes"], "scale": 1 / (1024 * 1024)},
 ]
 
+# Headline numbers across all workers: the series, how workers are combined, and the format
+STAT_CARDS = [
+    {"id": "request-rate", "title": "Requests/s", "series": "request_rate", "combine": sum, "format": "{:.1f}"},
+    {"id": "latency-p95", "title": "p95 latency", "series": "latency_p95", "combine": max, "format": "{:.0f} ms",
+     "scale": 1000},
+    {"id": "queue-depth", "title": "Queued", "series": "queue_depth", "combine": sum, "format": "{:.0f}"},
+    {"id": "cache-hit-rate", "title": "Cache hit rate", "series": "cache_hit_rate",
+     "combine": lambda values: sum(values) / len(values), "format": "{:.0f}%", "scale": 100},
+    {"id": "memory", "title": "Memory (PSS)", "series": "memory_bytes", "combine": sum, "format": "{:.0f} MB",
+     "scale": 1 / (1024 * 1024)},
+]
+
+
+def trace_name(key):
+    series, source = key
+    suffix = series.rpartition("_")[2]
+    return f"{source} {suffix}" if series.startswith("latency_") else source
+
+
+def build_figure(chart, keys, columns):
+    """Full figure for a chart; only sent when its set of traces changes."""
+    return {
+        "data": [
+            {"type": "scatter", "mode": "lines", "name": trace_name(key),
+             "x": (times * 1000).tolist(), "y": (values * chart["scale"]).tolist()}
+            for key, (times, values) in zip(keys, columns)
+        ],
+        "layout": {
+            "title": {"text": chart["title"], "font": {"size": 14}},
+            "xaxis": {"type": "date"},
+            "yaxis": {"rangemode": "tozero"},
+            "margin": {"l": 50, "r": 10, "t": 40, "b": 30},
+            "legend": {"orientation": "h"},
+            "uirevision": chart["id"],
+        },
+    }
+
+
+def stat_value(card):
+    values = list(store.latest(card["series"]).values())
+    if not values:
+        return "–"
+    return card["format"].format(card["combine"](values) * card.get("scale", 1))
+
+
 # Generate card components
 cards = dbc.Row(
     [
@@ -39,46 +87,31 @@ cards = dbc.Row(
             dbc.Card(
                 [
                     dbc.CardHeader(
-                        html.H5(card["title"], className="card-title text-dark"),
+                        html.H6(card["title"], className="card-title text-dark mb-0"),
                         className="bg-light text-center",
                         style={"borderBottom": "1px solid silver"},
                     ),
                     dbc.CardBody(
-                        [
-                            html.P(
-                                card["description"],
-                                className="card-text text-muted",
-                                style={
-                                    "overflow": "hidden",
-                                    "textOverflow": "ellipsis",
-                                    "display": "-webkit-box",
-                                    "-webkit-line-clamp": 3,
-                                    "-webkit-box-orient": "vertical",
-                                },
-                            ),
-                            html.A(
-                                card["link_text"],
-                                href=card["link_url"],
-                                className="btn btn-primary mt-auto",
-                                style={"backgroundColor": "#1E90FF", "border": "none"},
-                            ),
-                        ],
-                        style={"display": "flex", "flexDirection": "column", "height": "100%"},
+                        html.H3(id=f"stat-{card['id']}", children="–", className="text-center mb-0"),
                     ),
                 ],
-                className="mb-4 shadow-sm hover-card",
-                style={
-                    "height": "20rem",
-                    "display": "flex",
-                    "flexDirection": "column",
-                    "border": "1px solid silver",
-                    "borderRadius": "10px",
-                    "transition": "transform 0.2s, box-shadow 0.2s",
-                },
+                className="mb-4 shadow-sm",
+                style={"border": "1px solid silver", "borderRadius": "10px"},
             ),
-            xs=12, sm=6, md=4, lg=3,
+            xs=6, md=4, lg=2,
+        )
+        for card in STAT_CARDS
+    ],
+    className="g-3 justify-content-center",
+)
+
+charts = dbc.Row(
+    [
+        dbc.Col(
+            dcc.Graph(id=chart["id"], config={"displayModeBar": False}, style={"height": "18rem"}),
+            xs=12, lg=6,
         )
-        for card in CARDS
+        for chart in CHARTS
     ],
     className="g-3",
 )
@@ -89,34 +122,63 @@ app.layout = dbc.Container(
         dbc.Navbar(
             dbc.Container(
                 [
-                    dbc.NavbarBrand("Investment Management Portal", className="ms-2 text-dark fw-bold"),
-                    dbc.Nav(
-                        [
-                            dbc.NavItem(dbc.NavLink("Log Out", href="#", className="text-dark")),
-                            dbc.NavItem(dbc.NavLink("Feedback", href="#", className="text-dark")),
-                            dbc.NavItem(dbc.NavLink("Help", href="#", className="text-dark")),
-                        ],
-                        className="ms-auto",
-                    ),
+                    dbc.NavbarBrand("Operations Dashboard", className="ms-2 text-dark fw-bold"),
+                    html.Span(id="sources", className="ms-auto text-muted"),
                 ]
             ),
             style={"backgroundColor": "#F8F9FA", "borderBottom": "1px solid silver"},
             className="mb-4 shadow-sm",
         ),
         cards,
-        html.Div(
-            [
-                html.P("© 2024 Investment Advisors Inc. All rights reserved.", className="mb-2 text-muted"),
-                html.A("Privacy Policy", href="#", className="me-3 text-muted"),
-                html.A("Terms of Service", href="#", className="text-muted"),
-            ],
-            className="text-center mt-4",
-        ),
+        charts,
+        dcc.Interval(id="refresh", interval=REFRESH_MS),
+        # Per chart, the traces the browser holds, and the time of the newest point it has
+        dcc.Store(id="chart-state"),
     ],
     fluid=True,
     style={"backgroundColor": "#F8F9FA", "paddingBottom": "20px"},
 )
 
+
+@app.callback(
+    [Output(chart["id"], "figure") for chart in CHARTS]
+    + [Output(chart["id"], "extendData") for chart in CHARTS]
+    + [Output(f"stat-{card['id']}", "children") for card in STAT_CARDS]
+    + [Output("sources", "children"), Output("chart-state", "data")],
+    Input("refresh", "n_intervals"),
+    State("chart-state", "data"),
+)
+def refresh(_, state):
+    """Append only the points that arrived since the last tick; rebuild a chart only when its traces change."""
+    store.expire()
+    state = state or {"since": None, "traces": {}}
+    # Every chart is read up to the same instant, so the next tick starts exactly where this one ends
+    since, until = state["since"], store.latest_time
+    figures, extensions, traces = [], [], {}
+    for chart in CHARTS:
+        keys = store.keys(*chart["series"])
+        traces[chart["id"]] = [list(key) for key in keys]
+        if since is None or traces[chart["id"]] != state["traces"].get(chart["id"]):
+            figures.append(build_figure(chart, keys, store.read(keys, until=until)))
+            extensions.append(no_update)
+        else:
+            columns = store.read(keys, since, until)
+            figures.append(no_update)
+            if any(len(times) for times, _ in columns):
+                extensions.append((
+                    {"x": [(times * 1000).tolist() for times, _ in columns],
+                     "y": [(values * chart["scale"]).tolist() for _, values in columns]},
+                    list(range(len(keys))),
+                    TIMESERIES_POINTS,
+                ))
+            else:
+                extensions.append(no_update)
+    workers = len({source for chart_traces in traces.values() for _, source in chart_traces})
+    state = {"since": until, "traces": traces}
+    stats = [stat_value(card) for card in STAT_CARDS]
+    return figures + extensions + stats + [f"{workers} workers reporting", state]
+
+
 # Run the app
 if __name__ == "__main__":
     app.run_server(debug=True)
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+
+from transformers import AutoModelForQuestionAnswering, AutoModelForSeq2SeqLM, AutoTokenizer, pipeline
+
+from cpu_inference import INFERENCE_MODE, optimize_for_cpu
+from instrumentation import instrument_pipeline
+
+# Directory holding one subdirectory per model; defaults to the repository itself
+MODELS_DIR = os.environ.get("MODELS_DIR", os.path.dirname(os.path.abspath(__file__)))
+# Never reach out to the Hub; models must already be saved in their local directories
+OFFLINE = os.environ.get("MODELS_OFFLINE", os.environ.get("HF_HUB_OFFLINE", "0")).lower() in ("1", "true")
+
+# name -> (pipeline task, Hub model id, local directory, model class)
+MODEL_SPECS = {
+    "summarizer": ("summarization", "t5-small", "t5-small", AutoModelForSeq2SeqLM),
+    "qa": (
+        "question-answering",
+        "distilbert-base-uncased-distilled-squad",
+        "distilbert-base-uncased-distilled-squad",
+        AutoModelForQuestionAnswering,
+    ),
+}
+
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin", "model.safetensors.index.json", "pytorch_model.bin.index.json")
+
+
+def has_local_weights(model_dir):
+    """True when the directory holds a config and weights that can be loaded offline."""
+    return os.path.isfile(os.path.join(model_dir, "config.json")) and any(
+        os.path.isfile(os.path.join(model_dir, name)) for name in WEIGHT_FILES
+    )
+
+
+def load_model(name, models_dir=MODELS_DIR, offline=OFFLINE, inference_mode=INFERENCE_MODE):
+    """Load one pipeline, preferring the local directory and loading the weights once.
+
+    If the local directory has no weights yet, they are fetched from the Hub a
+    single time and saved there, so later starts need no network access. The
+    pipeline is then prepared for CPU serving in ``inference_mode`` (fp32 or int8).
+    """
+    task, hub_id, local_name, model_class = MODEL_SPECS[name]
+    model_dir = os.path.join(models_dir, local_name)
+    start_time = time.perf_counter()
+    if has_local_weights(model_dir):
+        model = model_class.from_pretrained(model_dir, local_files_only=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
+        origin = model_dir
+    elif offline:
+        raise RuntimeError(
+            f"No weights for '{name}' in {model_dir} and offline mode is on; "
+            f"save {hub_id} there first or unset MODELS_OFFLINE/HF_HUB_OFFLINE."
+        )
+    else:
+        model = model_class.from_pretrained(hub_id)
+        tokenizer = AutoTokenizer.from_pretrained(hub_id)
+        model.save_pretrained(model_dir)
+        tokenizer.save_pretrained(model_dir)
+        origin = f"{hub_id} (saved to {model_dir})"
+    # Per-call tokenize/infer/decode timings go to the shared metrics registry
+    loaded = optimize_for_cpu(
+        instrument_pipeline(pipeline(task, model=model, tokenizer=tokenizer), name), inference_mode
+    )
+    print(f"Loaded {name} model ({inference_mode}) from {origin} in {time.perf_counter() - start_time:.2f}s")
+    return loaded
+
+
+class ModelRegistry:
+    """Loads each pipeline on first use and keeps it for the life of the process."""
+
+    def __init__(self, models_dir=MODELS_DIR, offline=OFFLINE, inference_mode=INFERENCE_MODE):
+        self.models_dir = models_dir
+        self.offline = offline
+        self.inference_mode = inference_mode
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        """The pipeline for ``name``, loading it the first time it is asked for."""
+        model = self.models.get(name)
+        if model is None:
+            with self.lock:
+                model = self.models.get(name)
+                if model is None:
+                    model = load_model(name, self.models_dir, self.offline, self.inference_mode)
+                    self.models[name] = model
+        return model
+
+    def preload(self, *names):
+        """Load the given pipelines up front, e.g. before the first request."""
+        for name in names:
+            self.get(name)
+
+    def share_memory(self):
+        """Move loaded weights into shared memory, so processes forked afterwards use one copy.
+
+        The weights are copied into ``/dev/shm``, which must have room for all of them.
+        """
+        for model in self.models.values():
+            model.model.share_memory()
+
+    def is_loaded(self, name):
+        return name in self.models
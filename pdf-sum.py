@@ -1,97 +1,108 @@
-import os
-from PyPDF2 import PdfReader
-from bs4 import BeautifulSoup
-from transformers import pipeline
+import argparse
+import itertools
+import time
 
-def read_pdf(file_path):
-    """Read the text content from a PDF file."""
-    text = ""
-    try:
-        reader = PdfReader(file_path)
-        for page in reader.pages:
-            text += page.extract_text()
-    except Exception as e:
-        print(f"Error reading PDF {file_path}: {e}")
-    return text
-
-def read_html(file_path):
-    """Read the text content from an HTML file."""
-    text = ""
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            soup = BeautifulSoup(file, "html.parser")
-            text = soup.get_text()
-    except Exception as e:
-        print(f"Error reading HTML {file_path}: {e}")
-    return text
-
-def read_text(file_path):
-    """Read the text content from a plain text file."""
-    text = ""
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            text = file.read()
-    except Exception as e:
-        print(f"Error reading text file {file_path}: {e}")
-    return text
+from dedup import Deduplicator
+from extraction_cache import ExtractionCache
+from model_registry import ModelRegistry
+from summary_jobs import run_jobs
+from summarization import (
+    BATCH_SIZE,
+    CHUNK_TOKENS,
+    MAX_SUMMARY_LENGTH,
+    NUM_BEAMS,
+    TARGET_LENGTH,
+    summarize_document,
+)
 
 def read_folder(content):
-    """Read all PDF, HTML, and text files in the specified content folder."""
-    file_contents = {}
-    for root, dirs, files in os.walk(content):
-        for file in files:
-            file_path = os.path.join(root, file)
-            if file.lower().endswith(".pdf"):
-                file_contents[file] = read_pdf(file_path)
-            elif file.lower().endswith((".html", ".htm")):
-                file_contents[file] = read_html(file_path)
-            elif file.lower().endswith(".txt"):
-                file_contents[file] = read_text(file_path)
-            else:
-                print(f"Skipping unsupported file: {file}")
-    return file_contents
+    """Stream the pages of all PDF, HTML, and text files in the folder, grouped by file.
+
+    Yields ``(filename, pages)`` where ``pages`` iterates that file's page texts.
+    """
+    # Unchanged files are read back from the extraction cache instead of re-parsed
+    cache = ExtractionCache()
+    cache.sync(content)
+    for filename, records in itertools.groupby(cache.iter_pages(content), key=lambda record: record.source):
+        yield filename, (record.text for record in records)
 
-def summarize_text(text, summarizer, chunk_size=512, max_summary_length=128):
-    """Summarize the text using the LLM model."""
-    # Split the text into manageable chunks
-    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
-    summaries = []
-    for chunk in chunks:
-        # Summarize each chunk with modern parameters
-        summary = summarizer(chunk, max_length=max_summary_length, min_length=30, num_beams=4)
-        summaries.append(summary[0]['summary_text'])
-    return " ".join(summaries)
+def summarize_text(pages, summarizer, chunk_size=CHUNK_TOKENS, max_summary_length=MAX_SUMMARY_LENGTH,
+                   batch_size=BATCH_SIZE, num_beams=NUM_BEAMS, target_length=TARGET_LENGTH, dedup=None):
+    """Summarize the text (or a stream of page texts) using the LLM model."""
+    # Chunks of at most chunk_size tokens, cut on sentence and token boundaries,
+    # summarized in batches and then reduced until the summary fits target_length
+    return summarize_document(
+        pages,
+        summarizer,
+        chunk_tokens=chunk_size,
+        batch_size=batch_size,
+        num_beams=num_beams,
+        max_summary_length=max_summary_length,
+        target_length=target_length,
+        dedup=dedup,
+    )
 
-# Initialize the summarizer model
-# summarizer = pipeline("summarization", model="t5-small")
-# Specify the models you need
-summarizer_model = "t5-small"
-qa_model = "distilbert-base-uncased-distilled-squad"
+def main():
+    parser = argparse.ArgumentParser(description="Summarize every PDF, HTML and text file in a folder.")
+    parser.add_argument("content", nargs="?", default="content", help="folder containing the files")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="chunks per forward pass")
+    parser.add_argument("--num-beams", type=int, default=NUM_BEAMS, help="beam width; 1 decodes greedily")
+    parser.add_argument("--greedy", action="store_true", help="greedy decoding, same as --num-beams 1")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS, help="input tokens per chunk")
+    parser.add_argument("--max-summary-length", type=int, default=MAX_SUMMARY_LENGTH)
+    parser.add_argument("--target-length", type=int, default=TARGET_LENGTH, help="tokens in the final summary")
+    parser.add_argument("--output", help="stream summaries to this JSONL file and skip files already in it")
+    parser.add_argument("--workers", type=int, default=1, help="summarizer processes used with --output")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="summarize every chunk, even exact or near duplicates of one already summarized")
+    args = parser.parse_args()
+    num_beams = 1 if args.greedy else args.num_beams
 
-# Load and save summarization pipeline
-summarizer = pipeline("summarization", model=summarizer_model)
-summarizer.model.save_pretrained("./t5-small")
-summarizer.tokenizer.save_pretrained("./t5-small")
+    if args.output:
+        # Job-runner mode: parallel, streamed to JSONL and resumable after a crash
+        summary_options = {
+            "chunk_tokens": args.chunk_tokens,
+            "batch_size": args.batch_size,
+            "num_beams": num_beams,
+            "max_summary_length": args.max_summary_length,
+            "target_length": args.target_length,
+        }
+        run_jobs(args.content, args.output, workers=args.workers, summary_options=summary_options,
+                 dedup=not args.no_dedup)
+        return
 
-# Load and save QA pipeline
-qa_pipeline = pipeline("question-answering", model=qa_model)
-qa_pipeline.model.save_pretrained("./distilbert-base-uncased-distilled-squad")
-qa_pipeline.tokenizer.save_pretrained("./distilbert-base-uncased-distilled-squad")
+    # Load only the summarizer, from ./t5-small when it is already saved there
+    summarizer = ModelRegistry().get("summarizer")
 
-# Specify the folder containing content
-content = "content"
+    # Boilerplate and copied reports are summarized once; duplicates reuse that summary
+    dedup = None if args.no_dedup else Deduplicator("summaries")
 
-# Read contents of the folder
-contents = read_folder(content)
+    # Summarize the content of each file as its pages stream in
+    summaries = {}
+    start_time = time.perf_counter()
+    for filename, pages in read_folder(args.content):
+        print(f"Summarizing {filename}...")
+        summaries[filename] = summarize_text(
+            pages,
+            summarizer,
+            chunk_size=args.chunk_tokens,
+            max_summary_length=args.max_summary_length,
+            batch_size=args.batch_size,
+            num_beams=num_beams,
+            target_length=args.target_length,
+            dedup=dedup,
+        )
+    elapsed = time.perf_counter() - start_time
+    if elapsed > 0:
+        print(f"Summarized {len(summaries)} documents in {elapsed:.1f}s ({len(summaries) * 60 / elapsed:.1f} documents/min)")
+    if dedup is not None:
+        print(dedup.summary())
 
-# Summarize the content of each file
-summaries = {}
-for filename, content in contents.items():
-    print(f"Summarizing {filename}...")
-    summaries[filename] = summarize_text(content, summarizer, chunk_size=512, max_summary_length=128)
+    # Print summaries
+    for filename, summary in summaries.items():
+        print(f"--- Summary for {filename} ---")
+        print(summary)
+        print("\n")
 
-# Print summaries
-for filename, summary in summaries.items():
-    print(f"--- Summary for {filename} ---")
-    print(summary)
-    print("\n")
+if __name__ == "__main__":
+    main()
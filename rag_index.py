@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import time
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.vectorstores import Chroma
+
+from extraction_cache import file_hash
+
+PERSIST_DIRECTORY = "chroma_db"
+# Chroma.from_documents' default, so indexes built before incremental updates are reused
+COLLECTION_NAME = "langchain"
+# Remembers each indexed PDF's content hash and chunk IDs, next to the Chroma files
+MANIFEST_NAME = "index_manifest.json"
+
+
+def chunk_ids(source, chunks):
+    """Stable IDs from the source file and each chunk's content.
+
+    Repeated identical chunks within one file get an occurrence number, so every
+    ID is unique while unchanged chunks keep the ID they had before.
+    """
+    seen = {}
+    ids = []
+    for chunk in chunks:
+        digest = hashlib.sha256(f"{source}\0{chunk.page_content}".encode("utf-8")).hexdigest()
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(f"{digest[:32]}-{occurrence}")
+    return ids
+
+
+def load_manifest(persist_directory):
+    try:
+        with open(os.path.join(persist_directory, MANIFEST_NAME), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(persist_directory, manifest):
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, MANIFEST_NAME)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def list_pdfs(pdf_folder):
+    return sorted(filename for filename in os.listdir(pdf_folder) if filename.endswith(".pdf"))
+
+
+def sync_chroma(pdf_folder, embedding, text_splitter, persist_directory=PERSIST_DIRECTORY,
+                collection_name=COLLECTION_NAME):
+    """Open the persistent Chroma collection and bring it up to date incrementally.
+
+    PDFs whose content hash is unchanged (and whose chunks are all still in the
+    collection) are not even loaded. Changed PDFs are re-split and only chunks
+    with new IDs are embedded; chunks that disappeared, including those of
+    removed PDFs, are deleted. So are chunks no manifest entry knows of, such
+    as those of a collection built in one go by ``Chroma.from_documents``.
+    """
+    start_time = time.perf_counter()
+    db = Chroma(
+        collection_name=collection_name,
+        embedding_function=embedding,
+        persist_directory=persist_directory,
+    )
+    manifest = load_manifest(persist_directory)
+    existing = set(db.get(include=[])["ids"])
+    added = deleted = unchanged = 0
+
+    current = {}
+    for filename in list_pdfs(pdf_folder):
+        pdf_path = os.path.join(pdf_folder, filename)
+        digest = file_hash(pdf_path)
+        entry = manifest.get(filename)
+        if entry and entry["hash"] == digest and existing.issuperset(entry["ids"]):
+            current[filename] = entry
+            unchanged += 1
+            continue
+
+        print(f" Processing {filename}...")
+        chunks = text_splitter.split_documents(PyPDFLoader(pdf_path).load())
+        ids = chunk_ids(filename, chunks)
+        new = [(chunk_id, chunk) for chunk_id, chunk in zip(ids, chunks) if chunk_id not in existing]
+        if new:
+            db.add_documents([chunk for _, chunk in new], ids=[chunk_id for chunk_id, _ in new])
+            added += len(new)
+        stale = set(entry["ids"]) - set(ids) if entry else set()
+        if stale:
+            db.delete(ids=list(stale))
+            deleted += len(stale)
+        current[filename] = {"hash": digest, "ids": ids}
+        # Checkpoint after every file so an interrupted run keeps its progress
+        save_manifest(persist_directory, {**manifest, **current})
+
+    for filename in set(manifest) - set(current):
+        stale = [chunk_id for chunk_id in manifest[filename]["ids"] if chunk_id in existing]
+        if stale:
+            db.delete(ids=stale)
+            deleted += len(stale)
+        print(f" Removed {filename} from the index")
+
+    tracked = {chunk_id for entry in {**manifest, **current}.values() for chunk_id in entry["ids"]}
+    untracked = list(existing - tracked)
+    if untracked:
+        db.delete(ids=untracked)
+        deleted += len(untracked)
+        print(f" Removed {len(untracked)} chunks not tracked by the manifest")
+
+    save_manifest(persist_directory, current)
+    print(
+        f" Index ready in {time.perf_counter() - start_time:.1f}s: {unchanged} PDFs unchanged, "
+        f"{added} chunks embedded, {deleted} chunks deleted"
+    )
+    return db
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+from flask import Flask, Response, request, stream_with_context
+
+MODEL_PATH = os.environ.get("RAG_MODEL_PATH", os.path.join("models", "tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf"))
+N_CTX = int(os.environ.get("RAG_N_CTX", "2048"))
+MAX_TOKENS = int(os.environ.get("RAG_MAX_TOKENS", "256"))
+TEMPERATURE = float(os.environ.get("RAG_TEMPERATURE", "0.5"))
+# Bytes of saved KV states kept by llama.cpp for prompt-prefix reuse
+KV_CACHE_BYTES = int(os.environ.get("RAG_KV_CACHE_BYTES", str(512 * 1024 * 1024)))
+TOP_K = int(os.environ.get("RAG_TOP_K", "4"))
+
+# Every prompt starts with exactly this text, so its KV state is computed once and reused.
+# Anything that varies per request (context, question) must come after it.
+PROMPT_PREFIX = (
+    "<|system|>\n"
+    "You are a helpful assistant. Answer the question using only the context below. "
+    "If the context does not contain the answer, say that you don't know.</s>\n"
+    "<|user|>\n"
+)
+PROMPT_TEMPLATE = "Context:\n{context}\n\nQuestion: {question}</s>\n<|assistant|>\n"
+
+app = Flask(__name__)
+
+# Loaded once in init_service() and shared by every request
+llm = None
+retriever = None
+
+
+def build_prompt(question, documents):
+    context = "\n\n".join(doc.page_content for doc in documents)
+    return PROMPT_PREFIX + PROMPT_TEMPLATE.format(context=context, question=question)
+
+
+class LlamaGenerator:
+    """Streams completions from a resident llama.cpp model, reusing KV state for shared prefixes.
+
+    llama.cpp skips evaluating the leading tokens a prompt shares with the
+    previous one, and the RAM cache restores the saved state of the longest
+    cached prefix, so the fixed instruction prefix is evaluated once per process.
+    The model holds a single context, so generations run one at a time.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, n_ctx=N_CTX, kv_cache_bytes=KV_CACHE_BYTES):
+        from llama_cpp import Llama, LlamaRAMCache
+
+        start_time = time.perf_counter()
+        self.model = Llama(model_path=model_path, n_ctx=n_ctx, verbose=False)
+        if kv_cache_bytes:
+            self.model.set_cache(LlamaRAMCache(capacity_bytes=kv_cache_bytes))
+        self.lock = threading.Lock()
+        print(f"Loaded {model_path} in {time.perf_counter() - start_time:.2f}s")
+
+    def warm_up(self, prefix=PROMPT_PREFIX):
+        """Evaluate the shared prefix so the first request does not pay for it."""
+        for _ in self.stream(prefix, max_tokens=1):
+            pass
+
+    def stream(self, prompt, max_tokens=MAX_TOKENS, temperature=TEMPERATURE):
+        with self.lock:
+            for chunk in self.model(prompt, max_tokens=max_tokens, temperature=temperature, stream=True):
+                yield chunk["choices"][0]["text"]
+
+
+class FakeLLM:
+    """Stand-in with the LlamaGenerator interface that echoes the question word by word.
+
+    Lets the service, streaming and retrieval be exercised without model weights.
+    """
+
+    def __init__(self, token_delay=0.0):
+        self.token_delay = token_delay
+        self.prompts = []
+
+    def warm_up(self, prefix=PROMPT_PREFIX):
+        pass
+
+    def stream(self, prompt, max_tokens=MAX_TOKENS, temperature=TEMPERATURE):
+        self.prompts.append(prompt)
+        question = prompt.rsplit("Question: ", 1)[-1].split("</s>", 1)[0]
+        for word in f"You asked: {question}".split()[:max_tokens]:
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield word + " "
+
+
+def _event(**fields):
+    return json.dumps(fields) + "\n"
+
+
+@app.route("/ask", methods=["POST"])
+def ask():
+    """Stream the answer as newline-delimited JSON: sources first, then tokens, then a summary."""
+    payload = request.get_json(silent=True) or {}
+    question = (payload.get("question") or "").strip()
+    if not question:
+        return {"error": "Missing 'question'"}, 400
+    try:
+        max_tokens = int(payload.get("max_tokens", MAX_TOKENS))
+    except (TypeError, ValueError):
+        return {"error": "'max_tokens' must be an integer"}, 400
+    if max_tokens <= 0:
+        return {"error": "'max_tokens' must be positive"}, 400
+    start_time = time.perf_counter()
+    documents = retriever.invoke(question)
+    prompt = build_prompt(question, documents)
+
+    def generate():
+        yield _event(sources=[doc.metadata.get("source", "") for doc in documents])
+        first_token = None
+        tokens = 0
+        for text in llm.stream(prompt, max_tokens=max_tokens):
+            if first_token is None:
+                first_token = time.perf_counter() - start_time
+            tokens += 1
+            yield _event(token=text)
+        yield _event(
+            done=True,
+            tokens=tokens,
+            first_token_ms=(first_token or 0.0) * 1000,
+            total_ms=(time.perf_counter() - start_time) * 1000,
+        )
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route("/health")
+def health():
+    return {"status": "ok" if llm is not None and retriever is not None else "loading"}
+
+
+def init_service(pdf_folder="contents", fake_llm=False, backend=None):
+    """Load the retriever and the LLM once, and evaluate the shared prompt prefix."""
+    global llm, retriever
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    from embedding_store import EMBEDDING_DIR, CachedEmbeddings, EmbeddingStore
+    from rag_index import sync_chroma
+    from vector_index import VectorIndex
+
+    embedding_model_name = "sentence-transformers/all-MiniLM-L6-v2"
+    embedding = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name=embedding_model_name),
+        EmbeddingStore(os.path.join(EMBEDDING_DIR, embedding_model_name.replace("/", "--"))),
+    )
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    db = sync_chroma(pdf_folder, embedding, splitter)
+    if (backend or os.environ.get("RAG_BACKEND", "chroma")) == "numpy":
+        retriever = VectorIndex.from_chroma(db).as_retriever(embedding, k=TOP_K)
+    else:
+        retriever = db.as_retriever(search_kwargs={"k": TOP_K})
+    llm = FakeLLM() if fake_llm else LlamaGenerator()
+    llm.warm_up()
+
+
+def main():
+    """Serve RAG questions over HTTP with the LLM and retriever kept in memory."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("pdf_folder", nargs="?", default="contents")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default=None)
+    parser.add_argument("--fake-llm", action="store_true", help="use the echoing stand-in instead of TinyLlama")
+    args = parser.parse_args()
+
+    init_service(args.pdf_folder, args.fake_llm, args.backend)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
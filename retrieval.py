@@ -0,0 +1,253 @@
+import re
+import time
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from documents import COMPACT_DEAD_FRACTION
+from instrumentation import metrics, stage
+
+# Words are runs of letters/digits; everything else separates them
+WORD_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lower-case word tokens used for keyword scoring."""
+    return WORD_RE.findall(text.lower())
+
+
+def passage_spans(text, passage_words=150, overlap_words=30):
+    """Character spans of overlapping word windows over the text.
+
+    Windows are cut on word boundaries so no word is ever split in half.
+    """
+    spans = [match.span() for match in WORD_RE.finditer(text)]
+    if not spans:
+        return []
+    step = max(1, passage_words - overlap_words)
+    windows = []
+    for start in range(0, len(spans), step):
+        window = spans[start:start + passage_words]
+        windows.append((window[0][0], window[-1][1]))
+        if start + passage_words >= len(spans):
+            break
+    return windows
+
+
+def split_passages(text, passage_words=150, overlap_words=30):
+    """Split text into overlapping word windows, keeping the original characters."""
+    return [text[start:end] for start, end in passage_spans(text, passage_words, overlap_words)]
+
+
+def top_indices(scores, k):
+    """Indices of the k highest positive scores, best first."""
+    if not len(scores):
+        return []
+    k = min(k, len(scores))
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    ranked = candidates[np.argsort(-scores[candidates])]
+    return [int(i) for i in ranked if scores[i] > 0]
+
+
+def term_postings(texts, vocabulary, first_doc=0):
+    """``(term_ids, doc_ids, freqs)`` arrays with one posting per distinct term of each text.
+
+    Texts are numbered from ``first_doc`` and may be a stream; terms not yet in
+    ``vocabulary`` are added to it.
+    """
+    term_ids, doc_ids, freqs = array("i"), array("i"), array("f")
+    for doc_id, text in enumerate(texts, first_doc):
+        for term, freq in Counter(tokenize(text)).items():
+            term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+            doc_ids.append(doc_id)
+            freqs.append(freq)
+    return (
+        np.frombuffer(term_ids, dtype=np.int32),
+        np.frombuffer(doc_ids, dtype=np.int32),
+        np.frombuffer(freqs, dtype=np.float32),
+    )
+
+
+class BM25:
+    """BM25 scorer over flat NumPy posting arrays.
+
+    Postings are kept in a CSC-like layout: the postings of term ``t`` live in
+    ``doc_ids[term_ptr[t]:term_ptr[t + 1]]`` with matching term frequencies in
+    ``term_freqs``, so scoring a query only touches the postings of its terms.
+    The postings are the only per-document term data kept.
+    """
+
+    def __init__(self, vocabulary, term_ids, doc_ids, freqs, n_docs, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = vocabulary
+        self.n_docs = n_docs
+
+        order = np.lexsort((doc_ids, term_ids))
+        self.doc_ids = np.ascontiguousarray(doc_ids[order], dtype=np.int32)
+        self.term_freqs = np.ascontiguousarray(freqs[order], dtype=np.float32)
+        self.term_ptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=self.term_ptr[1:])
+        lengths = np.bincount(doc_ids, weights=freqs, minlength=n_docs).astype(np.float32)
+
+        doc_freqs = np.diff(self.term_ptr).astype(np.float32)
+        self.idf = np.log1p((self.n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        avg_length = float(lengths.mean()) if self.n_docs else 0.0
+        # Per-document length normalisation, precomputed once for every query
+        self.length_norm = k1 * (1 - b + b * lengths / max(avg_length, 1.0))
+
+    @classmethod
+    def from_texts(cls, texts, k1=1.5, b=0.75):
+        texts = list(texts)
+        vocabulary = {}
+        return cls(vocabulary, *term_postings(texts, vocabulary), len(texts), k1=k1, b=b)
+
+    def updated(self, kept, vocabulary, added, n_docs):
+        """A new scorer over the ``kept`` documents, renumbered in order, plus ``added`` postings.
+
+        ``vocabulary`` is a copy of this scorer's with the terms of the added
+        postings; terms no document uses any more are dropped from it.
+        """
+        new_ids = np.full(self.n_docs, -1, dtype=np.int32)
+        new_ids[kept] = np.arange(len(kept), dtype=np.int32)
+        term_ids = np.repeat(np.arange(len(self.term_ptr) - 1, dtype=np.int32), np.diff(self.term_ptr))
+        doc_ids = new_ids[self.doc_ids]
+        keep = doc_ids >= 0
+        term_ids = np.concatenate([term_ids[keep], added[0]])
+        doc_ids = np.concatenate([doc_ids[keep], added[1]])
+        freqs = np.concatenate([self.term_freqs[keep], added[2]])
+        used = np.bincount(term_ids, minlength=len(vocabulary)) > 0
+        if not used.all():
+            remap = np.cumsum(used) - 1
+            vocabulary = {term: int(remap[term_id]) for term, term_id in vocabulary.items() if used[term_id]}
+            term_ids = remap[term_ids]
+        return BM25(vocabulary, term_ids, doc_ids, freqs, n_docs, k1=self.k1, b=self.b)
+
+    def scores(self, query):
+        """BM25 score of every document for the query."""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+            docs = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end]
+            scores[docs] += self.idf[term_id] * freqs * (self.k1 + 1) / (freqs + self.length_norm[docs])
+        return scores
+
+
+class PassageIndex:
+    """BM25 index over the passages of a Corpus, kept as character spans into it.
+
+    Passage text is never copied into the index; it is read back from the
+    memory-mapped corpus for the few passages a question actually retrieves.
+    """
+
+    def __init__(self, corpus, starts, ends, page_ids, bm25,
+                 passage_words=150, overlap_words=30):
+        self.corpus = corpus
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.page_ids = np.asarray(page_ids, dtype=np.int32)
+        self.passage_words = passage_words
+        self.overlap_words = overlap_words
+        # Its postings also serve updates, so unchanged passages are never tokenized again
+        self.bm25 = bm25
+        # CorpusTokens of these passages for the QA model, attached before the index is served
+        self.tokens = None
+
+    @classmethod
+    def from_corpus(cls, corpus, passage_words=150, overlap_words=30):
+        """Index the live pages of a corpus, streaming one page at a time."""
+        with stage("index"):
+            vocabulary = {}
+            starts, ends, page_ids, postings = cls._passages(
+                corpus.numbered_records(), passage_words, overlap_words, vocabulary
+            )
+            bm25 = BM25(vocabulary, *postings, len(starts))
+            return cls(corpus, starts, ends, page_ids, bm25, passage_words=passage_words, overlap_words=overlap_words)
+
+    @staticmethod
+    def _passages(numbered_records, passage_words, overlap_words, vocabulary, first_doc=0):
+        starts, ends, page_ids = [], [], []
+
+        def texts():
+            for page_id, record in numbered_records:
+                chunk_start = time.perf_counter()
+                for start, end in passage_spans(record.text, passage_words, overlap_words):
+                    starts.append(record.offset + start)
+                    ends.append(record.offset + end)
+                    page_ids.append(page_id)
+                    yield record.text[start:end]
+                metrics.observe("stage_seconds", time.perf_counter() - chunk_start, stage="chunk")
+
+        postings = term_postings(texts(), vocabulary, first_doc)
+        return starts, ends, page_ids, postings
+
+    def __len__(self):
+        return len(self.starts)
+
+    def passage_text(self, passage_id):
+        return self.corpus.span(int(self.starts[passage_id]), int(self.ends[passage_id]))
+
+    def qa_context(self, passage_id):
+        """The passage as the QA model reads it: pre-tokenized if tokens are attached, else its text."""
+        text = self.passage_text(passage_id)
+        return self.tokens.context(passage_id, text) if self.tokens is not None else text
+
+    def source(self, passage_id):
+        return self.corpus.source(int(self.page_ids[passage_id]))
+
+    def search(self, query, top_k=3):
+        """Return ``(passage_id, score)`` pairs of the best matching passages."""
+        with stage("retrieve"):
+            scores = self.bm25.scores(query)
+            # Passages sharing no term with the question cannot hold its answer
+            return [(i, float(scores[i])) for i in top_indices(scores, top_k)]
+
+    def updated(self, new_page_ids, stale_sources, compact_fraction=COMPACT_DEAD_FRACTION):
+        """Return a new index with the passages of stale sources swapped for new pages.
+
+        Passages of untouched sources keep their spans and BM25 postings, so only
+        the newly appended pages are split and tokenized. Once retired pages take
+        more than ``compact_fraction`` of the corpus file, the new index is moved
+        onto a compacted copy of the corpus; callers should take ``.corpus`` from
+        the index returned.
+        """
+        stale = [self.corpus.source_ids[source] for source in stale_sources if source in self.corpus.source_ids]
+        kept = np.flatnonzero(~np.isin(self.corpus.page_source[self.page_ids], stale))
+        # A copy, since the current index keeps answering questions with its own
+        vocabulary = dict(self.bm25.vocabulary)
+        starts, ends, page_ids, postings = self._passages(
+            self.corpus.numbered_records(new_page_ids), self.passage_words, self.overlap_words,
+            vocabulary, first_doc=len(kept),
+        )
+        index = PassageIndex(
+            self.corpus,
+            np.concatenate([self.starts[kept], np.asarray(starts, dtype=np.int64)]),
+            np.concatenate([self.ends[kept], np.asarray(ends, dtype=np.int64)]),
+            np.concatenate([self.page_ids[kept], np.asarray(page_ids, dtype=np.int32)]),
+            self.bm25.updated(kept, vocabulary, postings, len(kept) + len(starts)),
+            self.passage_words,
+            self.overlap_words,
+        )
+        dead = self.corpus.dead_fraction()
+        if dead > compact_fraction:
+            start_time = time.perf_counter()
+            index = index.rebased(*self.corpus.compacted())
+            print(f"Compacted corpus ({dead:.0%} retired pages) in {time.perf_counter() - start_time:.2f}s")
+        return index
+
+    def rebased(self, corpus, remap):
+        """The same passages on a compacted copy of the corpus; ``remap`` maps old page ids to new ones."""
+        page_ids = remap[self.page_ids]
+        # Passages never cross pages, so each moves by the shift of its page's start
+        shift = corpus.char_offsets[page_ids] - self.corpus.char_offsets[self.page_ids]
+        index = PassageIndex(
+            corpus, self.starts + shift, self.ends + shift, page_ids, self.bm25,
+            self.passage_words, self.overlap_words,
+        )
+        index.tokens = self.tokens
+        return index
@@ -1,9 +1,12 @@
 import os
 import torch
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, Trainer, TrainingArguments
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, DataCollatorForSeq2Seq, Trainer, TrainingArguments
 from datasets import Dataset
 from langchain.document_loaders import PyPDFLoader
 
+from finetune_data import MAX_LENGTH, TokenThroughputCallback, build_examples, grouped_padding_ratio
+from inference_session import Seq2SeqSession
+
 # pip install langchain langchain-community chromadb faiss-cpu pypdf sentence-transformers llama-cpp-python requests tqdm
 # pip install transformers[torch] datasets
 
@@ -30,26 +33,26 @@ documents = load_pdf_text(pdf_folder)  # Extract text from PDFs
 if not documents:
     documents = ["This is a placeholder text. Add PDFs to train a real model."]
 
-dataset = Dataset.from_dict({"text": documents})
-
-# 4️ Tokenization Function (Updated for newer Transformers versions)
-def tokenize_function(examples):
-    model_inputs = tokenizer(examples["text"], truncation=True, padding="max_length", max_length=128)
-    
-    # Set labels directly using the decoder's vocabulary
-    # This replaces the deprecated as_target_tokenizer() context manager
-    labels = tokenizer(examples["text"], truncation=True, padding="max_length", max_length=128)
-    model_inputs["labels"] = labels["input_ids"]
-    
-    return model_inputs
-
-# Tokenize dataset
-tokenized_datasets = dataset.map(tokenize_function, batched=True)
+# 4️ Tokenize Whole Pages into Packed Examples
+# Long pages are cut into consecutive 128-token windows rather than truncated, and the
+# short leftovers are packed together, so no text is dropped and little is padding.
+# Padding happens per batch in the data collator, not up front.
+examples = build_examples(documents, tokenizer, MAX_LENGTH)
+tokenized_datasets = Dataset.from_dict(examples)
+data_collator = DataCollatorForSeq2Seq(tokenizer, model=model)
+
+BATCH_SIZE = int(os.environ.get("FINETUNE_BATCH_SIZE", "8"))
+print(
+    f"{len(documents)} pages -> {len(examples['length'])} examples, {sum(examples['length'])} tokens; "
+    f"padding is {grouped_padding_ratio(examples['length'], BATCH_SIZE):.1%} of each length-grouped batch"
+)
 
 # 5️ Define Training Arguments (Optimized for Low Memory)
 training_args = TrainingArguments(
     output_dir="./tiny_model",
-    per_device_train_batch_size=1,  # Low memory footprint
+    per_device_train_batch_size=BATCH_SIZE,  # Short packed sequences keep batches small
+    group_by_length=True,  # Batch similar lengths together to minimise padding
+    length_column_name="length",
     num_train_epochs=2,  # Reduce epochs to save RAM
     save_strategy="epoch",
     logging_dir="./logs",
@@ -63,6 +66,8 @@ trainer = Trainer(
     model=model,
     args=training_args,
     train_dataset=tokenized_datasets,
+    data_collator=data_collator,
+    callbacks=[TokenThroughputCallback(examples["length"])],
 )
 
 trainer.train()
@@ -74,21 +79,23 @@ tokenizer.save_pretrained("./tiny_model")
 print("✅ Fine-tuning complete! Model saved to './tiny_model'.")
 
 # 8️ Load Fine-Tuned Model for Inference
-def generate_text(prompt):
-    model = AutoModelForSeq2SeqLM.from_pretrained("./tiny_model")
-    tokenizer = AutoTokenizer.from_pretrained("./tiny_model")
-    
-    # Tokenize input text - don't need max_length for generation
-    inputs = tokenizer(prompt, return_tensors="pt", truncation=True)
+# The session loads ./tiny_model once (again only if the checkpoint changes) and
+# generates for lists of prompts in padded batches, returning outputs in input order.
+session = Seq2SeqSession("./tiny_model")
+EXAMPLE_PROMPTS = [
+    "What are the key points of this document?",
+    "Who is the document about?",
+    "What happened in the fourth quarter?",
+]
 
-    # Generate text with consistent max_new_tokens parameter
-    outputs = model.generate(**inputs, max_new_tokens=100)  # Adjust tokens as needed
-    
-    return tokenizer.decode(outputs[0], skip_special_tokens=True)
+def generate_text(prompt):
+    return session.generate([prompt], max_new_tokens=100)[0]
 
 # Example usage
 print("\n Example Generated Text:")
 print(generate_text("What is the summary of this document?"))
+for prompt, text in zip(EXAMPLE_PROMPTS, session.generate(EXAMPLE_PROMPTS, max_new_tokens=100)):
+    print(f"{prompt} -> {text}")
 
 # 9️ (optional) Upload model to Hugging Face Hub
 # model.push_to_hub("your-hf-username/your-fine-tuned-model")
@@ -1,14 +1,16 @@
 import os
 import requests
 from tqdm import tqdm
-import chromadb
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.llms import LlamaCpp
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains import RetrievalQA
 
+from dedup import Deduplicator
+from embedding_store import EMBEDDING_BATCH_SIZE, EMBEDDING_DIR, CachedEmbeddings, EmbeddingStore
+from rag_index import sync_chroma
+from vector_index import VectorIndex
+
 # pip install langchain langchain-community chromadb faiss-cpu pypdf sentence-transformers llama-cpp-python requests tqdm
 
 # Step 1: Define Model Path and URL
@@ -43,34 +45,42 @@ def download_model():
 if not os.path.exists(MODEL_PATH):
     download_model()
 
-# Step 3: Load and Process All PDFs from "contents/" Folder
+# Step 3: PDFs in the "contents/" Folder and How to Split Them into Chunks
 pdf_folder = "contents"
-all_documents = []
-
-for filename in os.listdir(pdf_folder):
-    if filename.endswith(".pdf"):
-        pdf_path = os.path.join(pdf_folder, filename)
-        print(f" Processing {filename}...")
-        loader = PyPDFLoader(pdf_path)
-        all_documents.extend(loader.load())
-
-# Step 4: Split Text into Chunks
 text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-docs = text_splitter.split_documents(all_documents)
-
-# Step 5: Create Embeddings (Using a Small Model)
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
 
-# Step 6: Store in Local Vector Database (ChromaDB)
-db = Chroma.from_documents(docs, embedding=embedding_model, persist_directory="chroma_db")
-db.persist()
+# Step 4: Create Embeddings (Using a Small Model)
+# Chunks are embedded in length-sorted batches, each distinct chunk only once, and the
+# vectors are kept in a memory-mapped store (one directory per embedding model).
+# Near-duplicate chunks (repeated disclaimers, headers, copied reports) reuse one vector.
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+embedding_dedup = Deduplicator("embeddings")
+embedding_model = CachedEmbeddings(
+    HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, encode_kwargs={"batch_size": EMBEDDING_BATCH_SIZE}),
+    EmbeddingStore(os.path.join(EMBEDDING_DIR, EMBEDDING_MODEL.replace("/", "--"))),
+    dedup=embedding_dedup,
+)
+
+# Step 5-6: Open the Local Vector Database (ChromaDB) and Update It Incrementally
+# Only new or changed PDFs are loaded and split, only new chunks are embedded,
+# and chunks of removed PDFs are deleted; an unchanged corpus just opens the index.
+db = sync_chroma(pdf_folder, embedding_model, text_splitter, persist_directory="chroma_db")
+if embedding_dedup.chunks:
+    print(f" {embedding_dedup.summary()}")
 
 #  Step 7: Load the TinyLlama Model
 print(f" Loading model from: {MODEL_PATH}")
 llm = LlamaCpp(model_path=MODEL_PATH, n_ctx=2048, temperature=0.5, verbose=True)
 
 # Step 8: Create Retrieval-Based Q&A Chain
-retriever = db.as_retriever()
+# RAG_BACKEND=numpy loads the chunks and their vectors out of Chroma once and answers
+# queries with exact in-process cosine search (optionally blended with BM25 through
+# RAG_BM25_WEIGHT); "chroma" queries the Chroma collection on every call.
+RAG_BACKEND = os.environ.get("RAG_BACKEND", "chroma")
+if RAG_BACKEND == "numpy":
+    retriever = VectorIndex.from_chroma(db).as_retriever(embedding_model)
+else:
+    retriever = db.as_retriever()
 qa_chain = RetrievalQA.from_chain_type(llm, retriever=retriever)
 
 # Step 9: Ask a Question
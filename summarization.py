@@ -0,0 +1,135 @@
+import re
+
+from instrumentation import stage
+
+# Sentence boundaries: whitespace after terminal punctuation, or a blank line
+SENTENCE_BOUNDARY_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+# Input tokens per chunk; leaves room for the task prefix T5 prepends ("summarize: ")
+CHUNK_TOKENS = 480
+BATCH_SIZE = 8
+NUM_BEAMS = 4
+MAX_SUMMARY_LENGTH = 128
+MIN_SUMMARY_LENGTH = 30
+# Reduce passes stop once the combined summary is at most this many tokens
+TARGET_LENGTH = 256
+MAX_REDUCE_LEVELS = 4
+
+
+def split_sentences(text):
+    """Split text into sentences."""
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY_RE.split(text) if sentence.strip()]
+
+
+def chunk_by_tokens(text, tokenizer, max_tokens=CHUNK_TOKENS):
+    """Pack whole sentences of the text into chunks of at most ``max_tokens`` tokens."""
+    return list(iter_chunks([text], tokenizer, max_tokens))
+
+
+def iter_chunks(pages, tokenizer, max_tokens=CHUNK_TOKENS):
+    """Pack whole sentences from a stream of page texts into token-bounded chunks.
+
+    Chunks are yielded as soon as they are full, so only one page and one chunk
+    are held at a time. Sentences longer than a chunk are cut on token
+    boundaries using the fast tokenizer's character offsets, so words are never
+    split in half.
+    """
+    current, current_tokens = [], 0
+    for page in pages:
+        with stage("chunk"):
+            sentences = split_sentences(page)
+            if not sentences:
+                continue
+            encoded = tokenizer(sentences, add_special_tokens=False, return_offsets_mapping=True)
+        for sentence, ids, offsets in zip(sentences, encoded["input_ids"], encoded["offset_mapping"]):
+            if len(ids) > max_tokens:
+                if current:
+                    yield " ".join(current)
+                    current, current_tokens = [], 0
+                starts = range(0, len(ids), max_tokens)
+                for start in starts:
+                    window = offsets[start:start + max_tokens]
+                    piece = sentence[window[0][0]:window[-1][1]]
+                    if start == starts[-1]:
+                        # The tail of the sentence keeps packing with what follows
+                        current, current_tokens = [piece], len(window)
+                    else:
+                        yield piece
+                continue
+            if current_tokens + len(ids) > max_tokens:
+                yield " ".join(current)
+                current, current_tokens = [], 0
+            current.append(sentence)
+            current_tokens += len(ids)
+    if current:
+        yield " ".join(current)
+
+
+def count_tokens(text, tokenizer):
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def summarize_chunks(chunks, summarizer, batch_size=BATCH_SIZE, num_beams=NUM_BEAMS,
+                     max_length=MAX_SUMMARY_LENGTH, min_length=MIN_SUMMARY_LENGTH):
+    """Summarize chunks in padded batches; ``num_beams=1`` decodes greedily."""
+    if not chunks:
+        return []
+    outputs = summarizer(
+        chunks,
+        batch_size=batch_size,
+        num_beams=num_beams,
+        do_sample=False,
+        max_length=max_length,
+        min_length=min(min_length, max_length - 1),
+        truncation=True,
+    )
+    return [output["summary_text"] for output in outputs]
+
+
+def summarize_document(pages, summarizer, chunk_tokens=CHUNK_TOKENS, batch_size=BATCH_SIZE,
+                       num_beams=NUM_BEAMS, max_summary_length=MAX_SUMMARY_LENGTH,
+                       min_summary_length=MIN_SUMMARY_LENGTH, target_length=TARGET_LENGTH, dedup=None):
+    """Map-reduce summarization: summarize chunks, then summarize the summaries.
+
+    ``pages`` is a text or a stream of page texts; chunks are summarized a batch
+    at a time as the stream is read. Each reduce pass re-chunks the joined
+    partial summaries and summarizes them again, until the result is at most
+    ``target_length`` tokens long. With a ``dedup.Deduplicator`` shared across
+    documents (and the same options), chunks that duplicate one already
+    summarized reuse its summary.
+    """
+    if isinstance(pages, str):
+        pages = [pages]
+    tokenizer = summarizer.tokenizer
+
+    def summarize_batch(chunks):
+        return summarize_chunks(chunks, summarizer, batch_size, num_beams, max_summary_length, min_summary_length)
+
+    def summarize_map(chunks):
+        return dedup.map(chunks, summarize_batch) if dedup is not None else summarize_batch(chunks)
+
+    partials, batch = [], []
+    for chunk in iter_chunks(pages, tokenizer, chunk_tokens):
+        batch.append(chunk)
+        if len(batch) == batch_size:
+            partials.extend(summarize_map(batch))
+            batch = []
+    partials.extend(summarize_map(batch))
+    summary = " ".join(partials)
+    for _ in range(MAX_REDUCE_LEVELS):
+        length = count_tokens(summary, tokenizer)
+        if length <= target_length:
+            break
+        chunks = chunk_by_tokens(summary, tokenizer, chunk_tokens)
+        if len(chunks) == 1:
+            # Last pass: one chunk left, so let it use the whole target length
+            return summarize_chunks(
+                chunks, summarizer, batch_size, num_beams, target_length, min_summary_length
+            )[0]
+        reduced = " ".join(summarize_chunks(
+            chunks, summarizer, batch_size, num_beams, max_summary_length, min_summary_length
+        ))
+        if count_tokens(reduced, tokenizer) >= length:
+            break
+        summary = reduced
+    return summary
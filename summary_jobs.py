@@ -0,0 +1,112 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import torch
+
+from dedup import Deduplicator
+from extraction_cache import ExtractionCache
+from model_registry import ModelRegistry
+from summarization import summarize_document
+
+# Set in each worker process by _init_worker
+_summarizer = None
+_summary_options = {}
+_cache = None
+_dedup = None
+
+
+def load_checkpoints(output_path):
+    """Content hash of every file already summarized in the JSONL output."""
+    done = {}
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut short by a crash; that file is simply redone
+                continue
+            done[record["file"]] = record["hash"]
+    return done
+
+
+def _init_worker(summary_options, threads, cache_dir, dedup):
+    global _summarizer, _summary_options, _cache, _dedup
+    # Split the cores between workers instead of every worker using all of them
+    torch.set_num_threads(threads)
+    _summarizer = ModelRegistry().get("summarizer")
+    _summary_options = summary_options
+    _cache = ExtractionCache(cache_dir)
+    # Duplicate chunks are recognised across the files one worker summarizes
+    _dedup = Deduplicator("summaries") if dedup else None
+
+
+def _summarize_job(source, digest):
+    start_time = time.perf_counter()
+    saved_before = _dedup.report()["saved_seconds"] if _dedup else 0.0
+    # Pages are read from the extraction cache here, so no text crosses processes
+    pages = _cache.read_pages(digest)
+    if pages is None:
+        # Not checkpointed, so the next run extracts and summarizes the file again
+        raise FileNotFoundError(f"extracted text of {source} is no longer in {_cache.cache_dir}")
+    summary = summarize_document(pages, _summarizer, dedup=_dedup, **_summary_options)
+    saved = _dedup.report()["saved_seconds"] - saved_before if _dedup else 0.0
+    return {"file": source, "hash": digest, "summary": summary, "seconds": time.perf_counter() - start_time,
+            "dedup_saved_seconds": saved}
+
+
+def run_jobs(content, output_path, workers=1, summary_options=None, cache=None, dedup=True):
+    """Summarize every file in the folder across worker processes.
+
+    Each summary is appended to the JSONL output as soon as it finishes, and
+    files whose content hash is already recorded there are skipped, so an
+    interrupted run picks up where it stopped. With ``dedup``, each worker
+    reuses summaries of chunks that duplicate ones it has already summarized.
+    """
+    cache = cache or ExtractionCache()
+    cache.sync(content)
+    hashes = cache.hashes(content)
+    done = load_checkpoints(output_path)
+    pending = [source for source in hashes if done.get(source) != hashes[source]]
+    print(f"{len(hashes) - len(pending)} of {len(hashes)} files already summarized; {len(pending)} to go")
+    if not pending:
+        return 0
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    start_time = time.perf_counter()
+    finished = 0
+    saved_seconds = 0.0
+    with open(output_path, "a+", encoding="utf-8") as output, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(summary_options or {}, threads, cache.cache_dir, dedup)
+    ) as executor:
+        # Start on a fresh line if the previous run died halfway through writing one
+        if output.tell() > 0:
+            output.seek(output.tell() - 1)
+            if output.read(1) != "\n":
+                output.write("\n")
+        futures = {
+            executor.submit(_summarize_job, source, hashes[source]): source
+            for source in pending
+        }
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                print(f"Error summarizing {source}: {e}")
+                continue
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            os.fsync(output.fileno())
+            finished += 1
+            saved_seconds += record["dedup_saved_seconds"]
+            elapsed = time.perf_counter() - start_time
+            rate = finished * 60 / elapsed
+            eta = (len(pending) - finished) * 60 / rate if rate else 0.0
+            print(f"[{finished}/{len(pending)}] {source} in {record['seconds']:.1f}s ({rate:.1f} files/min, ETA {eta:.0f}s)")
+    if dedup:
+        print(f"Reusing summaries of duplicate chunks saved about {saved_seconds:.1f}s of model time")
+    return finished
@@ -0,0 +1,61 @@
+import os
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def app_module(tmp_path_factory):
+    """The Flask app loaded over the repository's contents folder, with caches in a temporary directory."""
+    cache_dir = tmp_path_factory.mktemp("caches")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("EXTRACT_CACHE_DIR", str(cache_dir / "extract"))
+        patch.setenv("TOKEN_CACHE_DIR", str(cache_dir / "tokens"))
+        patch.setenv("EXTRACT_WORKERS", "1")
+        # The QA model is replaced by a stub handler in these tests, so it is never loaded
+        patch.setenv("QA_TOKEN_CACHE", "0")
+        patch.chdir(ROOT)
+        patch.syspath_prepend(ROOT)
+        from model_registry import ModelRegistry
+
+        patch.setattr(ModelRegistry, "preload", lambda self, *names: None)
+        import app
+
+        yield app
+    if app.qa_batcher:
+        app.qa_batcher.close()
+
+
+def test_batch_timeout_is_reported_as_busy_and_cancelled(app_module, monkeypatch):
+    from answer_cache import AnswerCache
+    from batching import MicroBatcher
+
+    release = threading.Event()
+    handled = []
+
+    def handler(items):
+        handled.extend(items)
+        release.wait(10)
+        return [[] for _ in items]
+
+    batcher = MicroBatcher(handler, window=0)
+    monkeypatch.setattr(app_module, "qa_batcher", batcher)
+    monkeypatch.setattr(app_module, "answer_cache", AnswerCache(max_entries=0))
+    monkeypatch.setattr(app_module, "QA_TIMEOUT", 0.2)
+    try:
+        # Keeps the batcher busy, so the question below waits in the queue until it times out
+        blocker = batcher.submit("blocker")
+        response = app_module.app.test_client().post("/", data={"question": "What does NVIDIA make?"})
+        assert response.status_code == 200
+        assert b"The server is busy" in response.data
+
+        release.set()
+        blocker.result(timeout=10)
+        # The timed-out request was cancelled, so the batcher dropped it instead of running it
+        batcher.submit("after").result(timeout=10)
+        assert handled == ["blocker", "after"]
+    finally:
+        release.set()
+        batcher.close()
@@ -0,0 +1,49 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from documents import Corpus  # noqa: E402
+from retrieval import PassageIndex  # noqa: E402
+
+
+def file_size(corpus):
+    return os.fstat(corpus.file.fileno()).st_size
+
+
+def test_repeated_edits_keep_the_corpus_file_bounded(tmp_path):
+    corpus = Corpus(str(tmp_path / "corpus.txt"))
+    corpus.append([("other.txt", 0, "untouched text about chess openings " * 50)])
+    corpus.append([("edited.txt", 0, "version 0 " + "filler words " * 200)])
+    index = PassageIndex.from_corpus(corpus)
+    sizes = []
+    for version in range(1, 50):
+        text = f"version {version} " + "filler words " * 200
+        new_pages = index.corpus.replace(["edited.txt"], [("edited.txt", 0, text)])
+        index = index.updated(new_pages, ["edited.txt"])
+        sizes.append(file_size(index.corpus))
+
+    # Retired pages never take more than half of the file, so it stays within twice the live text
+    live_bytes = sum(len(record.text.encode("utf-8")) for record in index.corpus.records())
+    assert max(sizes) <= 2 * live_bytes + len("version 49 filler words ")
+    assert index.corpus.dead_fraction() <= 0.5
+
+    # Spans and sources still point at the right text after compaction
+    (passage_id, _), = index.search("version 49", top_k=1)
+    assert index.passage_text(passage_id).startswith("version 49")
+    assert index.source(passage_id) == "edited.txt"
+    (passage_id, _), = index.search("chess openings", top_k=1)
+    assert index.passage_text(passage_id).startswith("untouched text about chess")
+    assert sorted(index.corpus.sources) == ["edited.txt", "other.txt"]
+
+
+def test_readers_of_the_old_index_survive_compaction():
+    corpus = Corpus()
+    corpus.append([("a.txt", 0, "alpha beta gamma"), ("b.txt", 0, "delta epsilon")])
+    old = PassageIndex.from_corpus(corpus)
+    new_pages = corpus.replace(["a.txt"], [("a.txt", 0, "alpha beta gamma zeta")])
+    new = old.updated(new_pages, ["a.txt"], compact_fraction=0.0)
+    assert new.corpus is not old.corpus
+    assert [old.passage_text(i) for i in range(len(old))] == ["alpha beta gamma", "delta epsilon"]
+    assert sorted(new.passage_text(i) for i in range(len(new))) == ["alpha beta gamma zeta", "delta epsilon"]
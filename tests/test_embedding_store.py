@@ -0,0 +1,28 @@
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from embedding_store import EmbeddingStore  # noqa: E402
+
+
+def test_get_on_an_empty_store_returns_no_rows(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"))
+    vectors = store.get([])
+    assert vectors.shape[0] == 0
+    assert vectors.dtype == np.float32
+
+
+def test_vectors_round_trip_and_are_seen_by_readers(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"), dtype="float16")
+    store.add(["a", "b"], np.array([[1.0, 2.0], [3.0, 4.0]]))
+    store.add(["b", "c"], np.array([[9.0, 9.0], [5.0, 6.0]]))
+    assert store.get([]).shape == (0, 2)
+    np.testing.assert_array_equal(store.get(["c", "a", "b"]), [[5.0, 6.0], [1.0, 2.0], [3.0, 4.0]])
+
+    reader = EmbeddingStore(str(tmp_path / "store"), dtype="float16", readonly=True)
+    assert len(reader) == 3
+    np.testing.assert_array_equal(reader.get(["b"]), [[3.0, 4.0]])
@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+
+import pytest
+from langchain_core.documents import Document
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import rag_service  # noqa: E402
+
+
+class StaticRetriever:
+    def __init__(self, documents):
+        self.documents = documents
+        self.questions = []
+
+    def invoke(self, question):
+        self.questions.append(question)
+        return self.documents
+
+
+@pytest.fixture
+def client(monkeypatch):
+    documents = [
+        Document(page_content="NVIDIA designs GPUs.", metadata={"source": "nvidia.pdf"}),
+        Document(page_content="GPUs run neural networks.", metadata={"source": "gpus.pdf"}),
+    ]
+    monkeypatch.setattr(rag_service, "llm", rag_service.FakeLLM())
+    monkeypatch.setattr(rag_service, "retriever", StaticRetriever(documents))
+    return rag_service.app.test_client()
+
+
+def test_ask_streams_sources_then_tokens_then_summary(client):
+    response = client.post("/ask", json={"question": "What does NVIDIA design?", "max_tokens": 3})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert events[0] == {"sources": ["nvidia.pdf", "gpus.pdf"]}
+    tokens = events[1:-1]
+    assert [event["token"] for event in tokens] == ["You ", "asked: ", "What "]
+    summary = events[-1]
+    assert summary["done"] is True
+    assert summary["tokens"] == 3
+    assert 0 <= summary["first_token_ms"] <= summary["total_ms"]
+    # The retrieved context goes into the prompt after the shared prefix
+    (prompt,) = rag_service.llm.prompts
+    assert prompt.startswith(rag_service.PROMPT_PREFIX)
+    assert "NVIDIA designs GPUs." in prompt
+
+
+@pytest.mark.parametrize("payload, error", [
+    ({}, "Missing 'question'"),
+    ({"question": "   "}, "Missing 'question'"),
+    ({"question": "Why?", "max_tokens": "many"}, "'max_tokens' must be an integer"),
+    ({"question": "Why?", "max_tokens": None}, "'max_tokens' must be an integer"),
+    ({"question": "Why?", "max_tokens": 0}, "'max_tokens' must be positive"),
+    ({"question": "Why?", "max_tokens": -5}, "'max_tokens' must be positive"),
+])
+def test_ask_rejects_bad_requests(client, payload, error):
+    response = client.post("/ask", json=payload)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": error}
+    assert rag_service.retriever.questions == []
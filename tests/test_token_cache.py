@@ -0,0 +1,77 @@
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class PassageList:
+    """The part of PassageIndex that CorpusTokens.for_index reads."""
+
+    passage_words, overlap_words = 400, 0
+
+    def __init__(self, texts):
+        self.texts = texts
+
+    def __len__(self):
+        return len(self.texts)
+
+    def passage_text(self, passage_id):
+        return self.texts[passage_id]
+
+
+@pytest.fixture(scope="module")
+def qa(tmp_path_factory):
+    """The QA pipeline with randomly initialised weights, built from the config and tokenizer in the repository.
+
+    Equivalence with the pipeline does not depend on the weights, so this runs offline.
+    """
+    import torch
+    from transformers import AutoConfig, AutoTokenizer
+
+    from model_registry import MODEL_SPECS, ModelRegistry
+
+    _, _, local_name, model_class = MODEL_SPECS["qa"]
+    models_dir = tmp_path_factory.mktemp("models")
+    torch.manual_seed(0)
+    model = model_class.from_config(AutoConfig.from_pretrained(os.path.join(ROOT, local_name)))
+    model.save_pretrained(models_dir / local_name)
+    AutoTokenizer.from_pretrained(os.path.join(ROOT, local_name)).save_pretrained(models_dir / local_name)
+    return ModelRegistry(models_dir=str(models_dir), offline=True).get("qa")
+
+
+def test_answers_match_the_pipeline_on_multi_window_passages(qa, tmp_path):
+    from token_cache import CorpusTokens, answer_tokenized
+
+    rng = random.Random(0)
+    words = "the cat sat on a mat in Paris during 1999 while Alice played chess with Bob at home".split()
+    # From one window up to several, so answers depend on how the windows are cut
+    texts = [
+        " ".join(rng.choice(words) for _ in range(length)) + " Alice won the game in Paris in 1999."
+        for length in (60, 400, 900)
+    ]
+    tokens = CorpusTokens.for_index(PassageList(texts), qa.tokenizer, "v1", str(tmp_path))
+    questions = ["Who won the game?", "In which city and in which year did the long chess match between the players end?"]
+    items = [(question, [tokens.context(i, text) for i, text in enumerate(texts)]) for question in questions]
+    for (question, _), results in zip(items, answer_tokenized(qa, items)):
+        for text, result in zip(texts, results):
+            expected = qa(question=question, context=text)
+            assert (result["start"], result["end"]) == (expected["start"], expected["end"])
+            assert result["score"] == pytest.approx(expected["score"], rel=1e-3, abs=1e-6)
+
+
+def test_only_new_passages_are_tokenized(qa, tmp_path):
+    from token_cache import CorpusTokens
+
+    texts = [f"passage number {i} about chess" for i in range(5)]
+    first = CorpusTokens.for_index(PassageList(texts), qa.tokenizer, "v1", str(tmp_path))
+    changed = texts[:2] + ["a brand new passage"] + texts[3:]
+    second = CorpusTokens.for_index(PassageList(changed), qa.tokenizer, "v2", str(tmp_path), previous=first)
+    for i, text in enumerate(changed):
+        assert list(second.tokens(i)[0]) == qa.tokenizer(text, add_special_tokens=False)["input_ids"]
+    # The first version was removed once the second was built
+    (settings_dir,) = os.listdir(tmp_path)
+    assert os.listdir(tmp_path / settings_dir) == ["v2"]
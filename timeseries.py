@@ -0,0 +1,160 @@
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from instrumentation import Histogram
+
+# Points kept per series; at one push a second this is the last hour
+TIMESERIES_POINTS = int(os.environ.get("TIMESERIES_POINTS", "3600"))
+# Seconds without a push after which a worker's series are dropped, e.g. after a restart
+SOURCE_TIMEOUT = float(os.environ.get("SOURCE_TIMEOUT", "60"))
+
+# Histogram whose per-interval count and quantiles give request rate and latency
+REQUEST_HISTOGRAM = "http_request_seconds"
+# Gauges reported as-is, under the series name they are charted as
+GAUGE_SERIES = {
+    "qa_queue_depth": "queue_depth",
+    "inference_queue_depth": "queue_depth",
+    "process_pss_bytes": "memory_bytes",
+}
+# Lifetime answer cache counters (reported as gauges) whose per-interval ratio is the hit rate
+CACHE_HITS, CACHE_MISSES = "answer_cache_hits_total", "answer_cache_misses_total"
+QUANTILES = (("latency_p50", 0.5), ("latency_p95", 0.95), ("latency_p99", 0.99))
+
+
+class RingBuffer:
+    """The newest ``capacity`` (time, value) points of one series, in preallocated NumPy arrays."""
+
+    def __init__(self, capacity=TIMESERIES_POINTS):
+        self.times = np.zeros(capacity)
+        self.values = np.zeros(capacity)
+        self.start = 0
+        self.size = 0
+
+    def append(self, timestamp, value):
+        capacity = len(self.times)
+        end = (self.start + self.size) % capacity
+        self.times[end] = timestamp
+        self.values[end] = value
+        if self.size < capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % capacity
+
+    def points(self, after=None, until=None):
+        """Points oldest first, optionally only those in the time range (after, until]."""
+        order = (self.start + np.arange(self.size)) % len(self.times)
+        times, values = self.times[order], self.values[order]
+        if after is not None or until is not None:
+            keep = np.ones(len(times), dtype=bool)
+            if after is not None:
+                keep &= times > after
+            if until is not None:
+                keep &= times <= until
+            times, values = times[keep], values[keep]
+        return times, values
+
+    def last(self):
+        if not self.size:
+            return None, None
+        end = (self.start + self.size - 1) % len(self.times)
+        return self.times[end], self.values[end]
+
+
+class TimeSeriesStore:
+    """Fixed-size time series per (series, source), fed with metrics snapshots that services push.
+
+    A source is one worker process (``service:pid``). Request rate, latency
+    quantiles and the cache hit rate are computed per push interval from the
+    difference between a source's consecutive snapshots, so they describe the
+    last second or so rather than the process lifetime.
+    """
+
+    def __init__(self, capacity=TIMESERIES_POINTS, source_timeout=SOURCE_TIMEOUT):
+        self.capacity = capacity
+        self.source_timeout = source_timeout
+        self.lock = threading.Lock()
+        self.series = {}
+        # Per source: time, request count, bucket counts and cache hits and misses of the previous snapshot
+        self.previous = {}
+        self.latest_time = 0.0
+
+    def _append(self, name, source, timestamp, value):
+        if value is None or math.isnan(value):
+            return
+        buffer = self.series.get((name, source))
+        if buffer is None:
+            buffer = self.series[name, source] = RingBuffer(self.capacity)
+        buffer.append(timestamp, value)
+        self.latest_time = max(self.latest_time, timestamp)
+
+    def push(self, source, snapshot):
+        """Record one snapshot from ``MetricsRegistry.snapshot()``."""
+        requests = [h for h in snapshot.get("histograms", []) if h["name"] == REQUEST_HISTOGRAM]
+        count = sum(h["count"] for h in requests)
+        buckets = np.sum([h["buckets"] for h in requests], axis=0) if requests else None
+        gauges = snapshot.get("gauges", {})
+        hits, misses = gauges.get(CACHE_HITS), gauges.get(CACHE_MISSES)
+        with self.lock:
+            now = time.time()
+            previous = self.previous.get(source)
+            self.previous[source] = (now, count, buckets, hits, misses)
+            if previous is not None and now > previous[0]:
+                previous_time, previous_count, previous_buckets, previous_hits, previous_misses = previous
+                if count < previous_count:
+                    # The worker restarted under the same pid; count from zero
+                    previous_count, previous_buckets = 0, None
+                if hits is not None and misses is not None and previous_hits is not None:
+                    if hits < previous_hits or misses < previous_misses:
+                        previous_hits, previous_misses = 0, 0
+                    lookups = (hits - previous_hits) + (misses - previous_misses)
+                    # No point for an interval without lookups, rather than a misleading 0%
+                    if lookups > 0:
+                        self._append("cache_hit_rate", source, now, (hits - previous_hits) / lookups)
+                self._append("request_rate", source, now, (count - previous_count) / (now - previous_time))
+                if buckets is not None:
+                    delta = buckets - previous_buckets if previous_buckets is not None else buckets
+                    if delta.sum() > 0:
+                        histogram = Histogram()
+                        histogram.counts = delta.tolist()
+                        histogram.count = int(delta.sum())
+                        for name, q in QUANTILES:
+                            self._append(name, source, now, histogram.quantile(q))
+            for gauge, value in gauges.items():
+                if gauge in GAUGE_SERIES:
+                    self._append(GAUGE_SERIES[gauge], source, now, value)
+
+    def expire(self):
+        """Forget sources that stopped pushing."""
+        cutoff = time.time() - self.source_timeout
+        with self.lock:
+            for source, (last_push, *_) in list(self.previous.items()):
+                if last_push < cutoff:
+                    del self.previous[source]
+                    for key in [key for key in self.series if key[1] == source]:
+                        del self.series[key]
+
+    def keys(self, *names):
+        """``(series, source)`` pairs present for the given series names, in a stable order."""
+        with self.lock:
+            return sorted(key for key in self.series if key[0] in names)
+
+    def read(self, keys, after=None, until=None):
+        """``(times, values)`` of each key, optionally only the points in (after, until]."""
+        with self.lock:
+            return [
+                self.series[key].points(after, until) if key in self.series else (np.zeros(0), np.zeros(0))
+                for key in keys
+            ]
+
+    def latest(self, name):
+        """Most recent value of a series for every source that has one."""
+        with self.lock:
+            return {
+                source: float(buffer.last()[1])
+                for (series, source), buffer in self.series.items()
+                if series == name and buffer.size
+            }
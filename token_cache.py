@@ -0,0 +1,281 @@
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from collections import namedtuple
+
+import numpy as np
+import torch
+
+from instrumentation import metrics, stage
+
+TOKEN_CACHE_DIR = os.environ.get("TOKEN_CACHE_DIR", ".token_cache")
+# The transformers question-answering pipeline's defaults: windows of MAX_SEQ_LEN tokens
+# (question included) overlapping by DOC_STRIDE tokens, and answers of up to 15 tokens
+MAX_SEQ_LEN = 384
+DOC_STRIDE = 128
+MAX_ANSWER_TOKENS = 15
+# Longer questions are cut, where the pipeline would fail on a question that leaves no room for context
+MAX_QUESTION_TOKENS = 64
+# Passages read, hashed and tokenized per step while building the cache
+TOKENIZE_BATCH = 1000
+IDS_NAME = "input_ids.i32"
+OFFSETS_NAME = "offsets.i32"
+
+# A retrieved passage ready for the QA model: its text, token IDs and token word spans
+TokenizedContext = namedtuple("TokenizedContext", ["text", "input_ids", "offsets"])
+
+
+def passage_hash(text):
+    """64-bit content hash of a passage, the key its tokens are reused under."""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _encode(texts, tokenizer):
+    """Token IDs and, per token, the character span of the word it belongs to."""
+    if not texts:
+        return []
+    encoded = tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True)
+    passages = []
+    for i, (ids, offsets) in enumerate(zip(encoded["input_ids"], encoded["offset_mapping"])):
+        # Answers are cut on whole words like the pipeline does, so each token keeps its word's span
+        words = {}
+        for word, (start, end) in zip(encoded.word_ids(i), offsets):
+            words.setdefault(word, [start, end])[1] = end
+        passages.append((
+            np.asarray(ids, dtype=np.int32),
+            np.asarray([words[word] for word in encoded.word_ids(i)], dtype=np.int32).reshape(-1, 2),
+        ))
+    return passages
+
+
+def _memmap(path, columns=1):
+    if not os.path.getsize(path):
+        return np.zeros((0, columns) if columns > 1 else 0, dtype=np.int32)
+    array = np.memmap(path, dtype=np.int32, mode="r")
+    return array.reshape(-1, columns) if columns > 1 else array
+
+
+class CorpusTokens:
+    """Token IDs and word offsets of every passage of an index, tokenized once and kept on disk.
+
+    Tokens of passage ``p`` are ``input_ids[token_ptr[p]:token_ptr[p + 1]]``,
+    with ``offsets`` holding the character span of each token's word relative
+    to the passage start, and ``hashes[p]`` the hash of the passage text.
+    A new corpus version copies the tokens of passages whose hash it already
+    has and only tokenizes new or changed ones. Token arrays are
+    memory-mapped, so forked workers share them.
+    """
+
+    def __init__(self, input_ids, offsets, token_ptr, hashes):
+        self.input_ids = input_ids
+        self.offsets = offsets
+        self.token_ptr = token_ptr
+        self.hashes = hashes
+        self._positions = None
+
+    def __len__(self):
+        return len(self.token_ptr) - 1
+
+    def tokens(self, passage_id):
+        start, end = self.token_ptr[passage_id], self.token_ptr[passage_id + 1]
+        return self.input_ids[start:end], self.offsets[start:end]
+
+    def positions(self):
+        """Passage hash -> passage number."""
+        if self._positions is None:
+            self._positions = {int(h): i for i, h in enumerate(self.hashes)}
+        return self._positions
+
+    @staticmethod
+    def build(directory, texts, tokenizer, previous=None):
+        """Write the tokens of a stream of passage texts into ``directory``.
+
+        Passages are processed ``TOKENIZE_BATCH`` at a time and appended to the
+        token files as they go, so only one batch is held in memory. Passages
+        whose hash is in ``previous`` are copied from it instead of tokenized.
+        Returns the number of passages tokenized.
+        """
+        known = previous.positions() if previous is not None else {}
+        os.makedirs(directory, exist_ok=True)
+        lengths, hashes, tokenized = [], [], 0
+        texts = iter(texts)
+        with open(os.path.join(directory, IDS_NAME), "wb") as ids_file, \
+                open(os.path.join(directory, OFFSETS_NAME), "wb") as offsets_file:
+            while True:
+                batch = list(itertools.islice(texts, TOKENIZE_BATCH))
+                if not batch:
+                    break
+                batch_hashes = [passage_hash(text) for text in batch]
+                missing = [text for text, h in zip(batch, batch_hashes) if h not in known]
+                encoded = iter(_encode(missing, tokenizer))
+                tokenized += len(missing)
+                for h in batch_hashes:
+                    ids, offsets = previous.tokens(known[h]) if h in known else next(encoded)
+                    ids_file.write(np.ascontiguousarray(ids, dtype=np.int32).tobytes())
+                    offsets_file.write(np.ascontiguousarray(offsets, dtype=np.int32).tobytes())
+                    lengths.append(len(ids))
+                    hashes.append(h)
+        token_ptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=token_ptr[1:])
+        np.save(os.path.join(directory, "token_ptr.npy"), token_ptr)
+        np.save(os.path.join(directory, "hashes.npy"), np.asarray(hashes, dtype=np.uint64))
+        return tokenized
+
+    @classmethod
+    def load(cls, directory):
+        return cls(
+            _memmap(os.path.join(directory, IDS_NAME)),
+            _memmap(os.path.join(directory, OFFSETS_NAME), columns=2),
+            np.load(os.path.join(directory, "token_ptr.npy")),
+            np.load(os.path.join(directory, "hashes.npy")),
+        )
+
+    @classmethod
+    def _latest(cls, root):
+        """The most recently built version under ``root``, to reuse tokens from after a restart."""
+        versions = [
+            os.path.join(root, name) for name in os.listdir(root)
+            if ".tmp" not in name and os.path.isfile(os.path.join(root, name, "hashes.npy"))
+        ] if os.path.isdir(root) else []
+        return cls.load(max(versions, key=os.path.getmtime)) if versions else None
+
+    @classmethod
+    def for_index(cls, index, tokenizer, corpus_version, cache_dir=TOKEN_CACHE_DIR, previous=None):
+        """Tokens for every passage of a PassageIndex, loaded from disk when already built.
+
+        Otherwise they are built from ``previous`` (or the latest version on disk)
+        plus the passages it does not have, and older versions are deleted.
+        """
+        settings = {
+            "tokenizer": tokenizer.name_or_path,
+            "vocab": len(tokenizer),
+            "passages": [index.passage_words, index.overlap_words],
+        }
+        key = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        root = os.path.join(cache_dir, key)
+        directory = os.path.join(root, corpus_version)
+        if os.path.isdir(directory):
+            return cls.load(directory)
+        if previous is None:
+            previous = cls._latest(root)
+        start_time = time.perf_counter()
+        # Written next to the target and renamed, so a reader never sees a half-written version
+        tmp_directory = f"{directory}.tmp{os.getpid()}"
+        with stage("tokenize_corpus"):
+            tokenized = cls.build(
+                tmp_directory, (index.passage_text(i) for i in range(len(index))), tokenizer, previous
+            )
+        try:
+            os.replace(tmp_directory, directory)
+        except OSError:
+            # Another process saved the same version first
+            shutil.rmtree(tmp_directory, ignore_errors=True)
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if path != directory and ".tmp" not in name:
+                shutil.rmtree(path, ignore_errors=True)
+        print(f"Tokenized {tokenized} of {len(index)} passages in {time.perf_counter() - start_time:.2f}s")
+        return cls.load(directory)
+
+    def context(self, passage_id, text):
+        """The passage's text with its token IDs and offsets as array views."""
+        return TokenizedContext(text, *self.tokens(passage_id))
+
+
+def windows(length, question_length, max_seq_len=MAX_SEQ_LEN, doc_stride=DOC_STRIDE):
+    """``(start, end)`` token ranges of a context cut as the pipeline cuts it for a question of this length.
+
+    Each window fills what the question and the three special tokens leave of
+    ``max_seq_len``, and overlaps the previous one by ``doc_stride`` tokens.
+    """
+    room = max_seq_len - question_length - 3
+    step = max(1, room - min(doc_stride, max_seq_len // 2))
+    spans = []
+    for start in range(0, length, step):
+        spans.append((start, min(start + room, length)))
+        if start + room >= length:
+            break
+    return spans
+
+
+def _best_span(start_logits, end_logits, context_start, context_end, max_answer_tokens=MAX_ANSWER_TOKENS):
+    """Most likely answer span in one window, scored the way the QA pipeline scores it."""
+    # Only context tokens can start or end an answer; [CLS] takes part in the softmax, then is dropped
+    mask = np.full(len(start_logits), -10000.0, dtype=np.float32)
+    mask[0] = 0.0
+    mask[context_start:context_end] = 0.0
+    probabilities = []
+    for logits in (start_logits, end_logits):
+        logits = np.where(mask < 0, mask, logits)
+        exp = np.exp(logits - logits.max())
+        exp = exp / exp.sum()
+        exp[0] = 0.0
+        probabilities.append(exp[context_start:context_end])
+    scores = np.tril(np.triu(np.outer(*probabilities)), max_answer_tokens - 1)
+    start, end = np.unravel_index(int(np.argmax(scores)), scores.shape)
+    return int(start), int(end), float(scores[start, end])
+
+
+def answer_tokenized(pipeline, items, batch_size=32):
+    """Answer ``(question, contexts)`` requests against pre-tokenized contexts.
+
+    Only the questions are tokenized; each is joined to windows of the cached
+    context tokens, sized for that question as the pipeline sizes them, and the
+    best span per context is mapped back to characters through the cached
+    offsets. Returns, like the pipeline, one ``{"answer", "score", "start", "end"}``
+    per context; the answers are the pipeline's for questions of up to
+    ``MAX_QUESTION_TOKENS`` tokens.
+    """
+    tokenizer, model = pipeline.tokenizer, pipeline.model
+    tokenize_start = time.perf_counter()
+    questions = tokenizer(
+        [question for question, _ in items], add_special_tokens=False, truncation=True, max_length=MAX_QUESTION_TOKENS
+    )["input_ids"]
+    # One feature per (request, context, window): [CLS] question [SEP] window [SEP]
+    features = []
+    for item_id, ((_, contexts), question_ids) in enumerate(zip(items, questions)):
+        for context_id, context in enumerate(contexts):
+            for start, end in windows(len(context.input_ids), len(question_ids)):
+                input_ids = [tokenizer.cls_token_id, *question_ids, tokenizer.sep_token_id,
+                             *context.input_ids[start:end].tolist(), tokenizer.sep_token_id]
+                features.append((item_id, context_id, input_ids, len(question_ids) + 2, context.offsets[start:end]))
+    metrics.observe("stage_seconds", time.perf_counter() - tokenize_start, stage="tokenize", model="qa")
+
+    best = {}
+    uses_token_types = "token_type_ids" in tokenizer.model_input_names
+    # Similar lengths share a batch, so little of each batch is padding
+    features.sort(key=lambda feature: len(feature[2]))
+    for batch_start in range(0, len(features), batch_size):
+        batch = features[batch_start:batch_start + batch_size]
+        width = max(len(feature[2]) for feature in batch)
+        input_ids = torch.full((len(batch), width), tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+        token_type_ids = torch.zeros((len(batch), width), dtype=torch.long)
+        for row, (_, _, ids, context_start, _) in enumerate(batch):
+            input_ids[row, :len(ids)] = torch.tensor(ids)
+            attention_mask[row, :len(ids)] = 1
+            token_type_ids[row, context_start:len(ids)] = 1
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if uses_token_types:
+            inputs["token_type_ids"] = token_type_ids
+        with stage("infer", model="qa"), torch.inference_mode():
+            outputs = model(**inputs)
+        decode_start = time.perf_counter()
+        start_logits, end_logits = outputs.start_logits.float().numpy(), outputs.end_logits.float().numpy()
+        for row, (item_id, context_id, ids, context_start, window_offsets) in enumerate(batch):
+            start, end, score = _best_span(start_logits[row], end_logits[row], context_start, len(ids) - 1)
+            if score > best.get((item_id, context_id), (-1.0,))[0]:
+                best[item_id, context_id] = (score, int(window_offsets[start][0]), int(window_offsets[end][1]))
+        metrics.observe("stage_seconds", time.perf_counter() - decode_start, stage="decode", model="qa")
+
+    results = []
+    for item_id, (_, contexts) in enumerate(items):
+        item_results = []
+        for context_id, context in enumerate(contexts):
+            score, start, end = best.get((item_id, context_id), (0.0, 0, 0))
+            item_results.append({"score": score, "start": start, "end": end, "answer": context.text[start:end]})
+        results.append(item_results)
+    return results
@@ -0,0 +1,167 @@
+import argparse
+import os
+import time
+from typing import Any, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from retrieval import BM25
+
+# Default weight of the BM25 keyword score in the blended score; 0 is pure cosine
+BM25_WEIGHT = float(os.environ.get("RAG_BM25_WEIGHT", "0"))
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def source_name(metadata):
+    """File name a chunk came from, used for source filters."""
+    return os.path.basename(metadata.get("source", ""))
+
+
+class VectorIndex:
+    """Exact top-k cosine search over chunk embeddings, held in one NumPy matrix.
+
+    A query is a single matrix-vector product over the unit-normalized vectors.
+    Keyword scores from BM25 can be blended in, and results can be restricted to
+    chunks from particular source files.
+    """
+
+    def __init__(self, vectors, documents):
+        self.vectors = normalize_rows(vectors)
+        self.documents = list(documents)
+        self.sources = sorted({source_name(doc.metadata) for doc in self.documents})
+        source_ids = {source: i for i, source in enumerate(self.sources)}
+        self.source_ids = np.array([source_ids[source_name(doc.metadata)] for doc in self.documents], dtype=np.int32)
+        self.bm25 = BM25.from_texts(doc.page_content for doc in self.documents)
+
+    @classmethod
+    def from_documents(cls, documents, embedding):
+        documents = list(documents)
+        return cls(embedding.embed_documents([doc.page_content for doc in documents]), documents)
+
+    @classmethod
+    def from_chroma(cls, db):
+        """Load every chunk and its stored embedding out of a Chroma collection once."""
+        data = db.get(include=["documents", "metadatas", "embeddings"])
+        documents = [
+            Document(page_content=text, metadata=metadata or {}, id=chunk_id)
+            for chunk_id, text, metadata in zip(data["ids"], data["documents"], data["metadatas"])
+        ]
+        return cls(data["embeddings"], documents)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query_vector, k=4, query=None, bm25_weight=0.0, sources=None):
+        """Return ``(position, score)`` pairs of the k best chunks in ``documents``, best first.
+
+        With ``bm25_weight`` above 0, the cosine score is blended with the BM25
+        score of ``query``, scaled to [0, 1] by the best match. ``sources``
+        restricts results to chunks from those file names.
+        """
+        scores = self.vectors @ normalize_rows(query_vector)
+        if bm25_weight and query:
+            keyword = self.bm25.scores(query)
+            best = keyword.max() if len(keyword) else 0.0
+            if best > 0:
+                scores = (1 - bm25_weight) * scores + bm25_weight * keyword / best
+        if sources is not None:
+            wanted = set(sources)
+            allowed = [i for i, source in enumerate(self.sources) if source in wanted]
+            scores = np.where(np.isin(self.source_ids, allowed), scores, -np.inf)
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(int(i), float(scores[i])) for i in ranked]
+
+    def as_retriever(self, embedding, **kwargs):
+        return NumpyRetriever(index=self, embedding=embedding, **kwargs)
+
+
+class NumpyRetriever(BaseRetriever):
+    """LangChain retriever over a VectorIndex, a drop-in for ``db.as_retriever()``."""
+
+    index: Any
+    embedding: Any
+    k: int = 4
+    bm25_weight: float = BM25_WEIGHT
+    sources: Optional[list] = None
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        query_vector = self.embedding.embed_query(query)
+        hits = self.index.search(query_vector, self.k, query, self.bm25_weight, self.sources)
+        return [self.index.documents[i] for i, _ in hits]
+
+
+def _percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000) if latencies else 0.0
+
+
+def compare_with_chroma(db, index, query_vectors, k=4):
+    """Query latency of Chroma and the NumPy index, and Chroma's recall@k against exact search."""
+    chroma_latencies, numpy_latencies, recalls = [], [], []
+    for vector in query_vectors:
+        start_time = time.perf_counter()
+        found = db.similarity_search_by_vector(vector, k=k)
+        chroma_latencies.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        exact = index.search(vector, k)
+        numpy_latencies.append(time.perf_counter() - start_time)
+
+        # The Chroma wrapper does not return chunk IDs, so hits are matched on their text
+        expected = {index.documents[i].page_content for i, _ in exact}
+        recalls.append(len(expected & {doc.page_content for doc in found}) / max(len(expected), 1))
+    report = {
+        name: {"p50_ms": _percentile_ms(latencies, 50), "p99_ms": _percentile_ms(latencies, 99)}
+        for name, latencies in (("chroma", chroma_latencies), ("numpy", numpy_latencies))
+    }
+    report["chroma_recall_at_k"] = float(np.mean(recalls)) if recalls else 0.0
+    return report
+
+
+def main():
+    """Compare query latency and recall of the NumPy index against Chroma on the indexed PDFs."""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    from embedding_store import EMBEDDING_DIR, CachedEmbeddings, EmbeddingStore
+    from rag_index import PERSIST_DIRECTORY, sync_chroma
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("pdf_folder", nargs="?", default="contents")
+    parser.add_argument("--persist-directory", default=PERSIST_DIRECTORY)
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--queries", type=int, default=200, help="chunks sampled as queries")
+    parser.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    embedding = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name=args.embedding_model),
+        EmbeddingStore(os.path.join(EMBEDDING_DIR, args.embedding_model.replace("/", "--"))),
+    )
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    db = sync_chroma(args.pdf_folder, embedding, splitter, persist_directory=args.persist_directory)
+    start_time = time.perf_counter()
+    index = VectorIndex.from_chroma(db)
+    print(f"Loaded {len(index)} chunks into the NumPy index in {time.perf_counter() - start_time:.2f}s")
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(index), size=min(args.queries, len(index)), replace=False)
+    queries = [index.documents[i].page_content[:200] for i in sample]
+    report = compare_with_chroma(db, index, [embedding.embed_query(query) for query in queries], args.k)
+    for name in ("chroma", "numpy"):
+        print(f"{name:>7}: p50 {report[name]['p50_ms']:.2f} ms, p99 {report[name]['p99_ms']:.2f} ms")
+    print(f"Chroma recall@{args.k} against exact search: {report['chroma_recall_at_k']:.3f}")
+
+
+if __name__ == "__main__":
+    main()